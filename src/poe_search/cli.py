@@ -0,0 +1,324 @@
+import argparse
+import os
+import sys
+
+# Heavy dependencies (pandas, SQLAlchemy, numpy) are imported inside the subcommands so startup stays fast
+
+
+def _psql_manager(args):
+    from .psql.manager import PsqlManager
+
+    db_password = args.db_password or os.environ.get("POE_SEARCH_DB_PASSWORD")
+    if not db_password:
+        raise SystemExit("A database password is required, pass --db-password or set POE_SEARCH_DB_PASSWORD.")
+
+    return PsqlManager(
+        db_password=db_password,
+        db_name=args.db_name,
+        user=args.db_user,
+        host=args.db_host,
+        port=args.db_port
+    )
+
+
+def _validate_table_names(table_names: list[str], valid_table_names: list[str]):
+    unknown_table_names = [name for name in table_names if name not in valid_table_names]
+    if unknown_table_names:
+        raise SystemExit(
+            f"Unknown tables: {', '.join(unknown_table_names)}.\nValid tables: {', '.join(valid_table_names)}"
+        )
+
+
+def _icon_mirror(args):
+    if not args.icon_dir:
+        return None
+
+    from .wiki_api.icons import IconMirror
+
+    return IconMirror(store_dir=args.icon_dir)
+
+
+def _discard_text_index(index_ids: list,
+                        texts: list):
+    pass
+
+
+def _run_update(args):
+    from .psql.mod_lookup import ModLookupView
+    from .updating.pipeline import UpdatePipeline
+    from .updating.table_updates import SourceTablesUpdater, simple_table_updaters
+    from .updating.updates import Updater
+
+    all_table_names = list(simple_table_updaters.keys()) + SourceTablesUpdater.table_names
+    table_names = args.tables or all_table_names
+    _validate_table_names(table_names, all_table_names)
+
+    psql_manager = _psql_manager(args)
+    updater = Updater(psql_manager)
+    table_updaters = [simple_table_updaters[name]() for name in table_names if name in simple_table_updaters]
+
+    # numpy appends .npz when saving, look for the file under the name it will have
+    similarity_path = args.similarity
+    if similarity_path and not similarity_path.endswith(".npz"):
+        similarity_path += ".npz"
+
+    similarity_engine = None
+    if similarity_path and os.path.exists(similarity_path):
+        from .search.similarity import SimilarityEngine
+
+        # Tables whose hash changed are diffed into the saved engine as they are written
+        similarity_engine = SimilarityEngine.load(
+            similarity_path,
+            sources=SimilarityEngine.table_sources([updater_cls() for updater_cls in simple_table_updaters.values()])
+        )
+        updater.add_table_update_listener(similarity_engine.on_table_update)
+
+    pipeline = UpdatePipeline(
+        updater=updater,
+        max_memory_bytes=args.memory_budget_mb * 1024**2,
+        fetch_workers=args.fetch_workers,
+        icon_mirror=_icon_mirror(args),
+        # Only fitting a new engine needs every text at once, otherwise nothing is kept past each table's write
+        text_index_consumer=None if similarity_path and similarity_engine is None else _discard_text_index
+    )
+    index_ids, texts = pipeline.run(table_updaters)
+    print(f"Peak pipeline memory: {pipeline.peak_memory_bytes / 1024**2:.1f} MB")
+    for table_name, error in pipeline.failures.items():
+        print(f"Failed to update PostgreSql table {table_name}.\n{error}")
+
+    if similarity_path:
+        if similarity_engine is None:
+            from .search.similarity import SimilarityEngine
+
+            similarity_engine = SimilarityEngine(sources=SimilarityEngine.table_sources(table_updaters))
+            similarity_engine.fit(index_ids=index_ids, texts=texts)
+            similarity_engine.build_neighbor_table()
+        similarity_engine.save(similarity_path)
+        print(f"Saved {len(similarity_engine)} similarity rows to {similarity_path}.")
+
+    for table_name in table_names:
+        if table_name in SourceTablesUpdater.table_names:
+            print(f"Updating PostgreSql table {table_name}.")
+            SourceTablesUpdater(updater).update_table(table_name)
+
+    if set(table_names) & set(ModLookupView.input_table_names):
+        mod_lookup_view = ModLookupView(psql_manager)
+        mod_lookup_view.create()
+        mod_lookup_view.refresh_if_stale()
+
+    # Tables that did update are kept, but schedulers should see the run as failed
+    return 1 if pipeline.failures else 0
+
+
+def _run_enqueue(args):
+    from .psql.jobs import PsqlJobQueue
+    from .updating.workers import RefreshWorker
+
+    job_names = args.tables or RefreshWorker.all_job_names()
+    _validate_table_names(job_names, RefreshWorker.all_job_names())
+
+    job_queue = PsqlJobQueue(_psql_manager(args))
+    job_queue.create_table()
+    refresh_id = job_queue.enqueue(job_names)
+
+    print(f"Enqueued {len(job_names)} jobs for refresh {refresh_id}.")
+
+
+def _run_worker(args):
+    from .psql.jobs import PsqlJobQueue
+    from .psql.mod_lookup import ModLookupView
+    from .updating.updates import Updater
+    from .updating.workers import RefreshWorker
+
+    psql_manager = _psql_manager(args)
+    job_queue = PsqlJobQueue(psql_manager, max_attempts=args.max_attempts)
+    job_queue.create_table()
+
+    RefreshWorker(
+        job_queue=job_queue,
+        updater=Updater(psql_manager),
+        worker_id=args.worker_id,
+        refresh_id=args.refresh_id,
+        icon_mirror=_icon_mirror(args),
+        mod_lookup_view=ModLookupView(psql_manager)
+    ).run(exit_when_idle=not args.keep_running)
+
+
+def _run_serve(args):
+    import threading
+
+    from .psql.jobs import PsqlJobQueue
+    from .psql.mod_lookup import ModLookupView
+    from .query.cache import LruCache
+    from .query.service import QueryService, serve
+    from .updating.updates import Updater
+    from .updating.workers import RefreshWorker
+
+    psql_manager = _psql_manager(args)
+    updater = Updater(psql_manager) if args.worker else None
+
+    query_service = QueryService(
+        psql_manager=psql_manager,
+        cache=LruCache(max_entries=args.cache_entries),
+        hash_poll_seconds=args.hash_poll_seconds,
+        updater=updater
+    )
+
+    if updater:
+        # Refresh jobs run in this process, so the tables they write reach the search indexes directly
+        job_queue = PsqlJobQueue(psql_manager)
+        job_queue.create_table()
+        worker = RefreshWorker(job_queue=job_queue, updater=updater, mod_lookup_view=ModLookupView(psql_manager))
+        threading.Thread(target=worker.run, kwargs={"exit_when_idle": False}, daemon=True).start()
+
+    serve(query_service, host=args.host, port=args.port)
+
+
+def _wiki_table_metadata(table_name: str, fields: list[str]):
+    from .updating.table_updates import simple_table_updaters
+    from .updating.updates import WikiTableMetaData
+
+    if fields:
+        return WikiTableMetaData(table_name=table_name, fields=fields)
+
+    # Accept either the PostgreSql table name or the wiki table name of a known updater
+    for psql_table_name, updater_cls in simple_table_updaters.items():
+        wiki_meta = updater_cls().wiki_table_metadata
+        if table_name in (psql_table_name, wiki_meta.table_name):
+            return wiki_meta
+
+    raise SystemExit(f"No known fields for wiki table {table_name}, pass them with --fields.")
+
+
+def _run_pull(args):
+    from .updating.updates import WikiApiFormatting
+    from .wiki_api.pull import WikiTablePull
+
+    wiki_meta = _wiki_table_metadata(args.table, args.fields)
+    data = WikiTablePull(
+        table_name=wiki_meta.table_name,
+        fields=wiki_meta.fields,
+        page_size=args.page_size
+    ).fetch_table_data()
+    df = WikiApiFormatting.format_api_data(data)
+
+    if args.output:
+        df.to_json(args.output, orient='records', indent=2)
+        print(f"Wrote {len(df)} records to {args.output}.")
+    else:
+        print(df)
+
+
+def _run_bench(args):
+    from .psql.manager import PsqlManager
+    from .updating.table_updates import simple_table_updaters
+    from .updating.updates import Updater, WikiApiFormatting
+    from .wiki_api.pull import WikiTablePull
+
+    table_names = args.tables or ['skill_qualities', 'mastery_effects']
+    _validate_table_names(table_names, list(simple_table_updaters.keys()))
+
+    updater = Updater(_psql_manager(args)) if args.upsert else None
+
+    for table_name in table_names:
+        table_updater = simple_table_updaters[table_name]()
+        wiki_meta = table_updater.wiki_table_metadata
+
+        print(f"Benchmarking {table_name}.")
+        data = WikiTablePull(table_name=wiki_meta.table_name, fields=wiki_meta.fields).fetch_table_data()
+        for _ in range(args.repeat):
+            df = WikiApiFormatting.format_api_data(data)
+            PsqlManager.hash_df(df)
+
+        if updater:
+            table_updater.upsert(updater)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="poe-search", description="Pull Path of Exile wiki tables into PostgreSql.")
+    parser.add_argument("--profile", metavar="DIR", help="write a cProfile file per stage into DIR")
+    parser.add_argument("--timings", action="store_true", help="print a timing summary of the hot path stages")
+
+    db_parser = argparse.ArgumentParser(add_help=False)
+    db_parser.add_argument("--db-password", help="defaults to $POE_SEARCH_DB_PASSWORD")
+    db_parser.add_argument("--db-name")
+    db_parser.add_argument("--db-user")
+    db_parser.add_argument("--db-host")
+    db_parser.add_argument("--db-port", type=int)
+
+    icon_parser = argparse.ArgumentParser(add_help=False)
+    icon_parser.add_argument("--icon-dir", metavar="DIR",
+                             help="mirror icons into DIR and record their paths in image_local_path")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", parents=[db_parser, icon_parser], help="refresh PostgreSql tables from the wiki")
+    update_parser.add_argument("--tables", nargs="+", metavar="TABLE", help="PostgreSql tables to refresh, default all")
+    update_parser.add_argument("--memory-budget-mb", type=int, default=512,
+                               help="DataFrame memory the pipeline may hold before fetches are throttled")
+    update_parser.add_argument("--fetch-workers", type=int, default=2)
+    update_parser.add_argument("--similarity", metavar="PATH",
+                               help="similarity engine file, fitted from the pulled text when missing, else updated")
+    update_parser.set_defaults(func=_run_update)
+
+    enqueue_parser = subparsers.add_parser("enqueue", parents=[db_parser],
+                                           help="queue a refresh for workers and print its refresh id")
+    enqueue_parser.add_argument("--tables", nargs="+", metavar="TABLE", help="PostgreSql tables to refresh, default all")
+    enqueue_parser.set_defaults(func=_run_enqueue)
+
+    worker_parser = subparsers.add_parser("worker", parents=[db_parser, icon_parser], help="claim and run queued refresh jobs")
+    worker_parser.add_argument("--refresh-id", help="only run the jobs of this refresh, default every refresh")
+    worker_parser.add_argument("--worker-id", help="defaults to <hostname>-<pid>")
+    worker_parser.add_argument("--max-attempts", type=int, default=3)
+    worker_parser.add_argument("--keep-running", action="store_true",
+                               help="keep polling for jobs instead of exiting once the queue is drained")
+    worker_parser.set_defaults(func=_run_worker)
+
+    serve_parser = subparsers.add_parser("serve", parents=[db_parser], help="serve lookups over HTTP/JSON")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--cache-entries", type=int, default=1024)
+    serve_parser.add_argument("--hash-poll-seconds", type=float, default=5,
+                              help="how often table hashes are checked for writes from other processes")
+    serve_parser.add_argument("--worker", action="store_true",
+                              help="also run queued refresh jobs in this process")
+    serve_parser.set_defaults(func=_run_serve)
+
+    pull_parser = subparsers.add_parser("pull", help="pull one wiki table and print it")
+    pull_parser.add_argument("table", help="wiki table name, or the PostgreSql table name of a known updater")
+    pull_parser.add_argument("--fields", nargs="+", help="wiki fields to pull, default the updater's fields")
+    pull_parser.add_argument("--page-size", type=int, default=200)
+    pull_parser.add_argument("--output", help="write the records to this JSON file instead of printing them")
+    pull_parser.set_defaults(func=_run_pull)
+
+    bench_parser = subparsers.add_parser("bench", parents=[db_parser], help="time the pull, format and hash stages")
+    bench_parser.add_argument("--tables", nargs="+", metavar="TABLE", help="PostgreSql tables to benchmark")
+    bench_parser.add_argument("--repeat", type=int, default=5, help="format and hash repetitions per table")
+    bench_parser.add_argument("--upsert", action="store_true", help="also run a full upsert, needs the database")
+    bench_parser.set_defaults(func=_run_bench, timings=True)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = _build_parser().parse_args(argv)
+
+    from .timing import timings
+
+    if args.profile:
+        timings.enable_profiling(args.profile)
+
+    try:
+        exit_code = args.func(args) or 0
+    finally:
+        if args.profile:
+            for path in timings.dump_profiles():
+                print(f"Wrote profile {path}")
+        if args.timings:
+            print(timings.summary())
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
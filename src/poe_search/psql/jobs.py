@@ -0,0 +1,175 @@
+
+import uuid
+from sqlalchemy import text
+
+from .manager import PsqlManager
+
+
+class PsqlJobQueue:
+
+    def __init__(self,
+                 psql_manager: PsqlManager,
+                 jobs_table_name: str = None,
+                 stale_after_seconds: int = 120,
+                 max_attempts: int = 3):
+        self._psql_manager = psql_manager
+        self._jobs_table_name = jobs_table_name or "refresh_jobs"
+        self._stale_after_seconds = stale_after_seconds
+        self._max_attempts = max_attempts
+
+    def create_table(self):
+        query = text(f"""
+                    CREATE TABLE IF NOT EXISTS {self._jobs_table_name} (
+                        id BIGSERIAL PRIMARY KEY,
+                        refresh_id TEXT NOT NULL,
+                        job_name TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        worker_id TEXT,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        error TEXT,
+                        enqueued_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                        heartbeat_at TIMESTAMPTZ,
+                        finished_at TIMESTAMPTZ
+                    )
+                """)
+        index_query = text(f"""
+                    CREATE INDEX IF NOT EXISTS {self._jobs_table_name}_status_idx
+                    ON {self._jobs_table_name} (status, enqueued_at)
+                """)
+        with self._psql_manager.engine.begin() as conn:
+            conn.execute(query)
+            conn.execute(index_query)
+
+    def enqueue(self,
+                job_names: list[str]) -> str:
+        refresh_id = uuid.uuid4().hex
+        query = text(f"""
+                    INSERT INTO {self._jobs_table_name} (refresh_id, job_name)
+                    VALUES (:refresh_id, :job_name)
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            conn.execute(query, [{"refresh_id": refresh_id, "job_name": job_name} for job_name in job_names])
+
+        return refresh_id
+
+    def _fail_exhausted_stale_jobs(self):
+        # A job that keeps killing its worker never reports a failure itself, so stop reclaiming it here
+        query = text(f"""
+                    UPDATE {self._jobs_table_name}
+                    SET status = 'failed',
+                        finished_at = NOW(),
+                        error = COALESCE(error, 'Worker stopped sending heartbeats on every attempt.')
+                    WHERE status = 'running'
+                        AND heartbeat_at < NOW() - make_interval(secs => :stale_seconds)
+                        AND attempts >= :max_attempts
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            conn.execute(query, {
+                "stale_seconds": self._stale_after_seconds,
+                "max_attempts": self._max_attempts
+            })
+
+    @staticmethod
+    def _refresh_filter(refresh_id: str | None) -> str:
+        return "AND refresh_id = :refresh_id" if refresh_id else ""
+
+    def claim(self,
+              worker_id: str,
+              refresh_id: str = None) -> tuple[int, str] | None:
+        self._fail_exhausted_stale_jobs()
+
+        # Running jobs whose worker stopped sending heartbeats are claimable the same as pending ones
+        query = text(f"""
+                    UPDATE {self._jobs_table_name}
+                    SET status = 'running', worker_id = :worker_id, attempts = attempts + 1, heartbeat_at = NOW()
+                    WHERE id = (
+                        SELECT id FROM {self._jobs_table_name}
+                        WHERE (
+                                status = 'pending'
+                                OR (
+                                    status = 'running'
+                                    AND heartbeat_at < NOW() - make_interval(secs => :stale_seconds)
+                                    AND attempts < :max_attempts
+                                )
+                            )
+                            {self._refresh_filter(refresh_id)}
+                        ORDER BY enqueued_at, id
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, job_name
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            result = conn.execute(query, {
+                "worker_id": worker_id,
+                "stale_seconds": self._stale_after_seconds,
+                "max_attempts": self._max_attempts,
+                "refresh_id": refresh_id
+            }).fetchone()
+
+        return (result[0], result[1]) if result else None
+
+    def heartbeat(self,
+                  job_id: int,
+                  worker_id: str) -> bool:
+        query = text(f"""
+                    UPDATE {self._jobs_table_name}
+                    SET heartbeat_at = NOW()
+                    WHERE id = :id AND worker_id = :worker_id AND status = 'running'
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            result = conn.execute(query, {"id": job_id, "worker_id": worker_id})
+
+        # False means another worker has taken over the job
+        return result.rowcount == 1
+
+    def complete(self,
+                 job_id: int,
+                 worker_id: str) -> bool:
+        query = text(f"""
+                    UPDATE {self._jobs_table_name}
+                    SET status = 'done', finished_at = NOW(), error = NULL
+                    WHERE id = :id AND worker_id = :worker_id
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            result = conn.execute(query, {"id": job_id, "worker_id": worker_id})
+
+        return result.rowcount == 1
+
+    def fail(self,
+             job_id: int,
+             worker_id: str,
+             error: str):
+        query = text(f"""
+                    UPDATE {self._jobs_table_name}
+                    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'pending' END,
+                        finished_at = CASE WHEN attempts >= :max_attempts THEN NOW() END,
+                        worker_id = NULL,
+                        error = :error
+                    WHERE id = :id AND worker_id = :worker_id
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            conn.execute(query, {
+                "id": job_id,
+                "worker_id": worker_id,
+                "error": error,
+                "max_attempts": self._max_attempts
+            })
+
+    def count_unfinished(self,
+                         refresh_id: str = None) -> int:
+        query = text(f"""
+                    SELECT COUNT(*) FROM {self._jobs_table_name}
+                    WHERE status IN ('pending', 'running') {self._refresh_filter(refresh_id)}
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            result = conn.execute(query, {"refresh_id": refresh_id}).fetchone()
+
+        return result[0]
@@ -1,10 +1,12 @@
 
 import hashlib
 import pandas as pd
-from sqlalchemy import create_engine, text, Table, MetaData
+from sqlalchemy import create_engine, select, text, Table, MetaData
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import ProgrammingError
 
+from ..timing import timed
+
 
 class PsqlManager:
 
@@ -13,21 +15,36 @@ class PsqlManager:
                  db_name: str = None,
                  user: str = None,
                  host: str = None,
-                 port: int = None):
+                 port: int = None,
+                 pool_size: int = None,
+                 max_overflow: int = None):
         _db_name = db_name or "poe_search"
         _user = user or "austinsnyder"
         _host = host or "localhost"
         _port = port or 5432
 
-        self._engine = create_engine(f"postgresql+psycopg2://{_user}:{db_password}@{_host}:{_port}/{_db_name}")
+        self._engine = create_engine(
+            f"postgresql+psycopg2://{_user}:{db_password}@{_host}:{_port}/{_db_name}",
+            pool_size=pool_size or 5,
+            max_overflow=max_overflow or 10,
+            pool_pre_ping=True
+        )
         self._metadata = MetaData()
         self._metadata.reflect(self._engine)
 
         self._conn = self._engine.begin()
 
+        self._table_hash_listeners = []
+
+    @property
+    def engine(self):
+        return self._engine
+
     @staticmethod
+    @timed('hash')
     def hash_df(df: pd.DataFrame):
-        return hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+        # Formatted wiki values are lists, which pandas cannot hash directly
+        return hashlib.sha256(pd.util.hash_pandas_object(df.astype(str), index=True).values.tobytes()).hexdigest()
 
     def _create_table(self,
                       psql_table_name: str) -> Table:
@@ -39,10 +56,21 @@ class PsqlManager:
 
         psql_table = self._create_table(psql_table_name)
         with self._engine.begin() as conn:
-            result = conn.execute(query, {"name": psql_table}).fetchone()
+            result = conn.execute(query, {"name": psql_table.name}).fetchone()
 
         return result[0] if result else None
 
+    def fetch_table_hashes(self) -> dict[str, str]:
+        query = text("SELECT table_name, data_hash FROM table_hashes")
+
+        with self._engine.begin() as conn:
+            result = conn.execute(query).fetchall()
+
+        return {table_name: data_hash for table_name, data_hash in result}
+
+    def add_table_hash_listener(self, listener):
+        self._table_hash_listeners.append(listener)
+
     def update_table_hash(self,
                           df_hash,
                           psql_table_name: str):
@@ -60,6 +88,9 @@ class PsqlManager:
             conn.execute(query, {"name": psql_table.name, "hash": df_hash})
             conn.commit()
 
+        for listener in self._table_hash_listeners:
+            listener(psql_table.name, df_hash)
+
     @staticmethod
     def fetch_table_id_column(self,
                               psql_table_name: str):
@@ -75,17 +106,33 @@ class PsqlManager:
                          psql_table_name: str) -> pd.DataFrame:
         psql_table = self._create_table(psql_table_name)
         try:
-            query = text("SELECT * FROM :psql_table")
+            # Table names cannot be bound as parameters, select from the reflected table instead
             with self._engine.begin() as conn:
-                result = conn.execute(query, {"psql_table": psql_table.name})
-
-            df = pd.DataFrame(result.fetchall(), columns=result.keys())
+                result = conn.execute(select(psql_table))
+                df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
         except ProgrammingError as err:
             print(f"PostgreSql {psql_table.name} does not exist.")
             raise err
 
         return df
 
+    def add_column(self,
+                   psql_table_name: str,
+                   col_name: str,
+                   col_type: str = "TEXT"):
+        psql_table = self._create_table(psql_table_name)
+        if col_name in psql_table.columns:
+            return
+
+        query = text(f"ALTER TABLE {psql_table.name} ADD COLUMN IF NOT EXISTS {col_name} {col_type}")
+        with self._engine.begin() as conn:
+            conn.execute(query)
+
+        # The reflected table is cached in the MetaData, reflect it again so inserts see the new column
+        self._metadata.remove(psql_table)
+        self._create_table(psql_table_name)
+
+    @timed('upsert')
     def update_table(self,
                      psql_table_name: str,
                      new_df: pd.DataFrame,
@@ -95,7 +142,7 @@ class PsqlManager:
         statement = insert(psql_table).values(records)
         statement = statement.on_conflict_do_update(
             index_elements=[id_col_name],
-            set_={col.name: statement.excluded[col.name] for col in psql_table.columns if col.name != new_df_id_col_name}
+            set_={col.name: statement.excluded[col.name] for col in psql_table.columns if col.name != id_col_name}
         )
 
         with self._engine.begin() as conn:
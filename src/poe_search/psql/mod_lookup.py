@@ -0,0 +1,92 @@
+
+import hashlib
+from sqlalchemy import text
+
+from .manager import PsqlManager
+
+
+class ModLookupView:
+    view_name = "mod_lookup"
+    input_table_names = ['mods', 'crafting_mods', 'mod_id_sources']
+
+    def __init__(self,
+                 psql_manager: PsqlManager):
+        self._psql_manager = psql_manager
+
+    def create(self):
+        # crafting_mods.mod_id may be a single id or a list of ids, jsonb handles both
+        query = text(f"""
+                    CREATE MATERIALIZED VIEW IF NOT EXISTS {self.view_name} AS
+                    WITH crafting AS (
+                        SELECT crafting_mod_ids.mod_id,
+                               jsonb_agg(
+                                   jsonb_build_object(
+                                       'id', c.id,
+                                       'item_class_categories', to_jsonb(c.item_class_categories)
+                                   )
+                                   ORDER BY c.id
+                               ) AS crafting_options
+                        FROM crafting_mods c
+                        CROSS JOIN LATERAL jsonb_array_elements_text(
+                            CASE jsonb_typeof(to_jsonb(c.mod_id))
+                                WHEN 'array' THEN to_jsonb(c.mod_id)
+                                ELSE jsonb_build_array(c.mod_id)
+                            END
+                        ) AS crafting_mod_ids(mod_id)
+                        GROUP BY crafting_mod_ids.mod_id
+                    ),
+                    sources AS (
+                        SELECT CAST(s.id AS TEXT) AS mod_id,
+                               jsonb_agg(DISTINCT s.source) AS sources
+                        FROM mod_id_sources s
+                        GROUP BY CAST(s.id AS TEXT)
+                    )
+                    SELECT CAST(m.id AS TEXT) AS mod_id,
+                           m.name,
+                           m.stat_text,
+                           m.mod_groups,
+                           COALESCE(crafting.crafting_options, '[]'::jsonb) AS crafting_options,
+                           COALESCE(sources.sources, '[]'::jsonb) AS sources
+                    FROM mods m
+                    LEFT JOIN crafting ON crafting.mod_id = CAST(m.id AS TEXT)
+                    LEFT JOIN sources ON sources.mod_id = CAST(m.id AS TEXT)
+                """)
+        # A unique index makes lookups a single index probe and allows concurrent refreshes
+        index_query = text(f"""
+                    CREATE UNIQUE INDEX IF NOT EXISTS {self.view_name}_mod_id_idx
+                    ON {self.view_name} (mod_id)
+                """)
+
+        with self._psql_manager.engine.begin() as conn:
+            conn.execute(query)
+            conn.execute(index_query)
+
+    def _inputs_hash(self,
+                     table_hashes: dict[str, str]) -> str:
+        inputs = "|".join(f"{name}:{table_hashes.get(name)}" for name in self.__class__.input_table_names)
+        return hashlib.sha256(inputs.encode("utf-8")).hexdigest()
+
+    def refresh_if_stale(self) -> bool:
+        table_hashes = self._psql_manager.fetch_table_hashes()
+        inputs_hash = self._inputs_hash(table_hashes)
+        if table_hashes.get(self.view_name) == inputs_hash:
+            return False
+
+        print(f"Refreshing materialized view {self.view_name}.")
+        with self._psql_manager.engine.begin() as conn:
+            conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self.view_name}"))
+
+        self._psql_manager.update_table_hash(
+            df_hash=inputs_hash,
+            psql_table_name=self.view_name
+        )
+        return True
+
+    def lookup(self,
+               mod_id: str) -> dict | None:
+        query = text(f"SELECT * FROM {self.view_name} WHERE mod_id = :mod_id")
+
+        with self._psql_manager.engine.connect() as conn:
+            result = conn.execute(query, {"mod_id": mod_id}).fetchone()
+
+        return dict(result._mapping) if result else None
@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+
+
+class LruCache:
+
+    def __init__(self,
+                 max_entries: int = 1024):
+        self._max_entries = max_entries
+
+        # Maps cache key -> (value, tables the value was read from)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self,
+            key,
+            value,
+            table_names: set[str]):
+        with self._lock:
+            self._entries[key] = (value, frozenset(table_names))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_table(self,
+                         table_name: str):
+        with self._lock:
+            stale_keys = [key for key, (_, table_names) in self._entries.items() if table_name in table_names]
+            for key in stale_keys:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
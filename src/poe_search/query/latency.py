@@ -0,0 +1,44 @@
+import math
+import threading
+from collections import defaultdict, deque
+
+
+class LatencyTracker:
+
+    def __init__(self,
+                 window_size: int = 2048,
+                 percentiles: tuple = (50, 90, 99)):
+        self._percentiles = percentiles
+        self._samples = defaultdict(lambda: deque(maxlen=window_size))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self,
+               endpoint: str,
+               seconds: float):
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+            self._counts[endpoint] += 1
+
+    @staticmethod
+    def _percentile(sorted_samples: list[float], percentile: float) -> float:
+        # Nearest-rank percentile
+        rank = max(math.ceil(percentile / 100 * len(sorted_samples)), 1)
+        return sorted_samples[rank - 1]
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {endpoint: sorted(endpoint_samples) for endpoint, endpoint_samples in self._samples.items()}
+            counts = dict(self._counts)
+
+        return {
+            endpoint: {
+                "count": counts[endpoint],
+                **{
+                    f"p{percentile}_ms": round(self._percentile(endpoint_samples, percentile) * 1000, 3)
+                    for percentile in self._percentiles
+                }
+            }
+            for endpoint, endpoint_samples in samples.items()
+            if endpoint_samples
+        }
@@ -0,0 +1,330 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pandas as pd
+from sqlalchemy import text
+
+from .cache import LruCache
+from .latency import LatencyTracker
+from ..psql.manager import PsqlManager
+from ..psql.mod_lookup import ModLookupView
+from ..search.autocomplete import AutocompleteIndex
+from ..search.stat_templates import StatTemplateIndex
+from ..updating.table_updates import simple_table_updaters
+from ..updating.updates import PsqlTableMetaData, Updater
+
+
+class QueryService:
+    # Distinguishes a cache miss from a cached lookup that found nothing
+    _missing = object()
+
+    def __init__(self,
+                 psql_manager: PsqlManager,
+                 cache: LruCache = None,
+                 hash_poll_seconds: float = 5,
+                 updater: Updater = None):
+        self._psql_manager = psql_manager
+        self._cache = cache or LruCache()
+        self._hash_poll_seconds = hash_poll_seconds
+        self._mod_lookup_view = ModLookupView(psql_manager)
+
+        self._autocomplete_index = AutocompleteIndex()
+        self._stat_template_index = StatTemplateIndex()
+        self._index_table_names = set(AutocompleteIndex.sources) | set(StatTemplateIndex.sources)
+
+        self._table_metas = {
+            table_name: updater_cls().psql_table_metadata
+            for table_name, updater_cls in simple_table_updaters.items()
+        }
+        self._table_metas['mod_id_sources'] = PsqlTableMetaData(
+            table_name='mod_id_sources',
+            fields=['id', 'source'],
+            id_col_name='id'
+        )
+
+        self._table_hashes = {}
+        self._last_hash_poll = 0.0
+        self._hash_lock = threading.Lock()
+
+        # Invalidate immediately for hashes recorded through this process, polling catches other processes
+        self._psql_manager.add_table_hash_listener(self._on_table_hash)
+
+        # Tables written by an updater in this process reach the indexes directly, without reading them back
+        self._updater = updater
+        if updater:
+            updater.add_table_update_listener(self.on_table_update)
+
+    @property
+    def cache(self) -> LruCache:
+        return self._cache
+
+    def _on_table_hash(self,
+                       table_name: str,
+                       data_hash: str):
+        self._cache.invalidate_table(table_name)
+
+        # The updater's table update listener already fed the indexes, so polling need not reload the table
+        if self._updater:
+            with self._hash_lock:
+                self._table_hashes[table_name] = data_hash
+
+    def on_table_update(self,
+                        psql_table_name: str,
+                        df: pd.DataFrame):
+        self._autocomplete_index.on_table_update(psql_table_name, df)
+        self._stat_template_index.on_table_update(psql_table_name, df)
+
+    def _reload_index_table(self,
+                            psql_table_name: str):
+        try:
+            df = self._psql_manager.fetch_table_data(psql_table_name)
+        except Exception as err:
+            print(f"Failed to load PostgreSql table {psql_table_name} into the search indexes.\n{err}")
+            return
+        self.on_table_update(psql_table_name, df)
+
+    def _poll_table_hashes(self,
+                           force: bool = False):
+        with self._hash_lock:
+            if not force and time.monotonic() - self._last_hash_poll < self._hash_poll_seconds:
+                return
+            self._last_hash_poll = time.monotonic()
+
+            table_hashes = self._psql_manager.fetch_table_hashes()
+            for table_name, data_hash in table_hashes.items():
+                if self._table_hashes.get(table_name) != data_hash:
+                    self._cache.invalidate_table(table_name)
+                    if table_name in self._index_table_names:
+                        self._reload_index_table(table_name)
+            self._table_hashes = table_hashes
+
+    def refresh(self):
+        # Loads the search indexes up front, otherwise the first request pays for it
+        self._poll_table_hashes(force=True)
+
+    def _table_meta(self,
+                    psql_table_name: str) -> PsqlTableMetaData:
+        if psql_table_name not in self._table_metas:
+            raise KeyError(f"PostgreSql table {psql_table_name} is not queryable.")
+        return self._table_metas[psql_table_name]
+
+    def _fetch_rows(self,
+                    query,
+                    params: dict) -> list[dict]:
+        with self._psql_manager.engine.connect() as conn:
+            result = conn.execute(query, params)
+            return [dict(row._mapping) for row in result]
+
+    def _cached(self,
+                key: tuple,
+                table_names: set[str],
+                fetch_func):
+        self._poll_table_hashes()
+
+        value = self._cache.get(key, default=self._missing)
+        if value is self._missing:
+            value = fetch_func()
+            self._cache.put(key, value, table_names=table_names)
+        return value
+
+    def fetch_by_id(self,
+                    psql_table_name: str,
+                    id_: str) -> list[dict]:
+        meta = self._table_meta(psql_table_name)
+        query = text(f'SELECT * FROM "{meta.table_name}" WHERE "{meta.id_col_name}" = :id')
+
+        return self._cached(
+            key=('id', meta.table_name, id_),
+            table_names={meta.table_name},
+            fetch_func=lambda: self._fetch_rows(query, {"id": id_})
+        )
+
+    def fetch_mod(self,
+                  mod_id: str) -> dict:
+        # Unknown mods are cached as None too, so repeated misses skip the view
+        mod = self._cached(
+            key=('mod', mod_id),
+            table_names={ModLookupView.view_name},
+            fetch_func=lambda: self._mod_lookup_view.lookup(mod_id)
+        )
+        if mod is None:
+            raise LookupError(f"No mod with id {mod_id}.")
+        return mod
+
+    def autocomplete(self,
+                     prefix: str,
+                     limit: int = 10) -> list[dict]:
+        if not prefix:
+            raise ValueError("Autocomplete text cannot be empty.")
+        if limit <= 0:
+            raise ValueError("Autocomplete limit must be positive.")
+
+        self._poll_table_hashes()
+        return [
+            {"name": entry.name, "table": entry.table_name}
+            for entry in self._autocomplete_index.complete(prefix, limit=limit)
+        ]
+
+    def stat_templates(self,
+                       contains: str = None,
+                       limit: int = 50) -> list[str]:
+        if limit <= 0:
+            raise ValueError("Template limit must be positive.")
+
+        self._poll_table_hashes()
+        return self._stat_template_index.templates(contains=contains)[:limit]
+
+    def stat_template_members(self,
+                              template: str,
+                              min_value: float = None,
+                              max_value: float = None,
+                              slot: int = 0,
+                              psql_table_name: str = None) -> list[dict]:
+        if not template:
+            raise ValueError("A stat template is required.")
+
+        self._poll_table_hashes()
+        members = self._stat_template_index.filter(
+            template=template,
+            min_value=min_value,
+            max_value=max_value,
+            slot=slot,
+            table_names={psql_table_name} if psql_table_name else None
+        )
+        return [{"table": table_name, "id": id_} for table_name, id_ in members]
+
+    def search(self,
+               query_text: str,
+               psql_table_name: str = None,
+               limit: int = 20) -> list[dict]:
+        if not query_text:
+            raise ValueError("Search text cannot be empty.")
+        if limit <= 0:
+            raise ValueError("Search limit must be positive.")
+
+        if psql_table_name:
+            metas = [self._table_meta(psql_table_name)]
+        else:
+            metas = list(self._table_metas.values())
+
+        metas = [meta for meta in metas if meta.text_col_name]
+        escaped_text = query_text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+        def fetch():
+            results = []
+            for meta in metas:
+                query = text(f"""
+                            SELECT "{meta.id_col_name}" AS id, CAST("{meta.text_col_name}" AS TEXT) AS text
+                            FROM "{meta.table_name}"
+                            WHERE CAST("{meta.text_col_name}" AS TEXT) ILIKE :pattern
+                            LIMIT :limit
+                        """)
+                rows = self._fetch_rows(query, {"pattern": f"%{escaped_text}%", "limit": limit - len(results)})
+                results.extend({"table": meta.table_name, **row} for row in rows)
+
+                if len(results) >= limit:
+                    break
+            return results
+
+        return self._cached(
+            key=('search', query_text.lower(), psql_table_name, limit),
+            table_names={meta.table_name for meta in metas},
+            fetch_func=fetch
+        )
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    _endpoints = {'tables', 'mods', 'search', 'autocomplete', 'templates', 'stats'}
+
+    def _send_json(self,
+                   status: int,
+                   body):
+        payload = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self,
+               path_parts: list[str],
+               params: dict):
+        query_service: QueryService = self.server.query_service
+
+        if len(path_parts) == 3 and path_parts[0] == 'tables':
+            return query_service.fetch_by_id(psql_table_name=path_parts[1], id_=path_parts[2])
+        if len(path_parts) == 2 and path_parts[0] == 'mods':
+            return query_service.fetch_mod(mod_id=path_parts[1])
+        if path_parts == ['search']:
+            return query_service.search(
+                query_text=params.get('q', [''])[0],
+                psql_table_name=params.get('table', [None])[0],
+                limit=int(params.get('limit', [20])[0])
+            )
+        if path_parts == ['autocomplete']:
+            return query_service.autocomplete(
+                prefix=params.get('q', [''])[0],
+                limit=int(params.get('limit', [10])[0])
+            )
+        if path_parts == ['templates']:
+            return query_service.stat_templates(
+                contains=params.get('q', [None])[0],
+                limit=int(params.get('limit', [50])[0])
+            )
+        if path_parts == ['templates', 'members']:
+            min_value = params.get('min', [None])[0]
+            max_value = params.get('max', [None])[0]
+            return query_service.stat_template_members(
+                template=params.get('template', [''])[0],
+                min_value=float(min_value) if min_value is not None else None,
+                max_value=float(max_value) if max_value is not None else None,
+                slot=int(params.get('slot', [0])[0]),
+                psql_table_name=params.get('table', [None])[0]
+            )
+        if path_parts == ['stats']:
+            return {
+                "latency": self.server.latency_tracker.summary(),
+                "cache": query_service.cache.stats()
+            }
+
+        raise LookupError(f"No endpoint for path /{'/'.join(path_parts)}.")
+
+    def do_GET(self):
+        start_time = time.perf_counter()
+        url = urlparse(self.path)
+        path_parts = [unquote(part) for part in url.path.split('/') if part]
+
+        endpoint = path_parts[0] if path_parts and path_parts[0] in self._endpoints else 'unknown'
+        try:
+            self._send_json(200, self._route(path_parts, parse_qs(url.query)))
+        except LookupError as err:
+            self._send_json(404, {"error": str(err)})
+        except ValueError as err:
+            self._send_json(400, {"error": str(err)})
+        except Exception as err:
+            print(f"Encountered error while serving {self.path}.\n{err}")
+            self._send_json(500, {"error": f"{type(err).__name__}: {err}"})
+        finally:
+            self.server.latency_tracker.record(endpoint, time.perf_counter() - start_time)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(query_service: QueryService,
+          host: str = "127.0.0.1",
+          port: int = 8080):
+    server = ThreadingHTTPServer((host, port), QueryRequestHandler)
+    server.query_service = query_service
+    server.latency_tracker = LatencyTracker()
+
+    query_service.refresh()
+
+    print(f"Serving PoE Search queries on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,353 @@
+import bisect
+import heapq
+import re
+import threading
+from collections import Counter
+
+import pandas as pd
+
+
+class AutocompleteEntry:
+    __slots__ = ('name', 'key', 'table_name', 'weight', 'sort_key')
+
+    def __init__(self,
+                 name: str,
+                 key: str,
+                 table_name: str,
+                 weight: float):
+        self.name = name
+        self.key = key
+        self.table_name = table_name
+        self.weight = weight
+        self.sort_key = None
+        self.update_sort_key()
+
+    def update_sort_key(self):
+        # Most popular first, then shortest, so exact-ish matches win ties
+        self.sort_key = (-self.weight, len(self.key), self.key)
+
+
+class _TrieNode:
+    __slots__ = ('children', 'entry_ids', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.entry_ids = []
+
+        # Best ranked entry ids at or below this node
+        self.top = ()
+
+
+class AutocompleteIndex:
+    _word_pattern = re.compile(r"[\w']+")
+    _gram_size = 2
+
+    # PostgreSql table -> candidate name columns, the first one present in the DataFrame is used
+    sources = {
+        'skills': ['skill_name', 'page_name'],
+        'corpse_items': ['item_name', 'page_name'],
+        'passive_skills': ['name'],
+        'pantheon_souls': ['enemy_name', 'name']
+    }
+
+    def __init__(self,
+                 top_k: int = 10,
+                 max_typos: int = 1,
+                 max_fuzzy_candidates: int = 128):
+        self._top_k = top_k
+        self._max_typos = max_typos
+        self._max_fuzzy_candidates = max_fuzzy_candidates
+
+        self._root = _TrieNode()
+        self._entries = {}
+        self._table_entry_ids = {}
+        self._next_entry_id = 0
+
+        # Every word of every name, so input can match from the start of any word, not only the start of the name
+        self._words = []
+        self._word_entry_ids = {}
+        self._word_grams = {}
+
+        # Updates run on the writer thread while readers call complete()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return re.sub(r'\s+', ' ', name).strip().casefold()
+
+    @staticmethod
+    def _df_names(df: pd.DataFrame, name_col_name: str) -> list[str]:
+        names = []
+        for val in df[name_col_name]:
+            vals = val if isinstance(val, list) else [val]
+            names.extend(v for v in vals if isinstance(v, str) and v.strip())
+        return names
+
+    @classmethod
+    def _words_of(cls, key: str) -> list[str]:
+        return cls._word_pattern.findall(key)
+
+    @classmethod
+    def _word_grams_of(cls, word: str) -> set[str]:
+        # Padding anchors the first gram to the start of the word, which is where users start typing
+        padded = ' ' + word
+        return {padded[i:i + cls._gram_size] for i in range(len(padded) - cls._gram_size + 1)}
+
+    def _index_words(self, key: str, entry_id: int):
+        for word in self._words_of(key):
+            entry_ids = self._word_entry_ids.get(word)
+            if entry_ids is None:
+                entry_ids = self._word_entry_ids[word] = set()
+                bisect.insort(self._words, word)
+                for gram in self._word_grams_of(word):
+                    self._word_grams.setdefault(gram, set()).add(word)
+            entry_ids.add(entry_id)
+
+    def _unindex_words(self, key: str, entry_id: int):
+        for word in self._words_of(key):
+            entry_ids = self._word_entry_ids.get(word)
+            if entry_ids is None:
+                continue
+            entry_ids.discard(entry_id)
+            if entry_ids:
+                continue
+
+            del self._word_entry_ids[word]
+            del self._words[bisect.bisect_left(self._words, word)]
+            for gram in self._word_grams_of(word):
+                words = self._word_grams[gram]
+                words.discard(word)
+                if not words:
+                    del self._word_grams[gram]
+
+    def _sorted_top(self, entry_ids) -> tuple:
+        return tuple(sorted(set(entry_ids), key=lambda entry_id: self._entries[entry_id].sort_key)[:self._top_k])
+
+    def _walk(self, key: str, create: bool = False) -> list[_TrieNode]:
+        path = [self._root]
+        node = self._root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return path
+                child = _TrieNode()
+                node.children[char] = child
+            node = child
+            path.append(node)
+        return path
+
+    def _refresh_paths(self, keys: set[str]):
+        # Recompute ranked lists for every touched node, deepest first so children are current before parents
+        levels = {}
+        for key in keys:
+            path = self._walk(key)
+            for depth, node in enumerate(path):
+                parent_char = (path[depth - 1], key[depth - 1]) if depth else (None, None)
+                levels.setdefault(depth, {})[id(node)] = (node, *parent_char)
+
+        for depth in sorted(levels, reverse=True):
+            for node, parent, char in levels[depth].values():
+                candidates = list(node.entry_ids)
+                for child in node.children.values():
+                    candidates.extend(child.top)
+                node.top = self._sorted_top(candidates)
+
+                if parent is not None and not node.top and not node.children:
+                    del parent.children[char]
+
+    def _add_entry(self, name: str, key: str, table_name: str, weight: float) -> int:
+        entry_id = self._next_entry_id
+        self._next_entry_id += 1
+
+        self._entries[entry_id] = AutocompleteEntry(name=name, key=key, table_name=table_name, weight=weight)
+        self._walk(key, create=True)[-1].entry_ids.append(entry_id)
+        self._index_words(key, entry_id)
+
+        return entry_id
+
+    def _remove_entry(self, entry_id: int):
+        entry = self._entries[entry_id]
+        path = self._walk(entry.key)
+        if len(path) == len(entry.key) + 1:
+            path[-1].entry_ids.remove(entry_id)
+        self._unindex_words(entry.key, entry_id)
+
+        del self._entries[entry_id]
+
+    def update_table(self,
+                     table_name: str,
+                     names: list[str],
+                     popularity: dict[str, float] = None):
+        with self._lock:
+            popularity = popularity or {}
+            old_entry_ids = self._table_entry_ids.get(table_name, {})
+
+            new_names = {}
+            for name in names:
+                new_names.setdefault(self.normalize(name), name)
+
+            touched_keys = set()
+            removed_keys = old_entry_ids.keys() - new_names.keys()
+            for key in removed_keys:
+                self._remove_entry(old_entry_ids[key])
+                touched_keys.add(key)
+
+            entry_ids = {key: entry_id for key, entry_id in old_entry_ids.items() if key not in removed_keys}
+            for key, name in new_names.items():
+                weight = popularity.get(name, popularity.get(key, 0))
+                if key not in entry_ids:
+                    entry_ids[key] = self._add_entry(name=name, key=key, table_name=table_name, weight=weight)
+                    touched_keys.add(key)
+                elif key in popularity or name in popularity:
+                    entry = self._entries[entry_ids[key]]
+                    entry.name = name
+                    entry.weight = weight
+                    entry.update_sort_key()
+                    touched_keys.add(key)
+
+            self._table_entry_ids[table_name] = entry_ids
+            self._refresh_paths(touched_keys)
+
+    def on_table_update(self,
+                        psql_table_name: str,
+                        df: pd.DataFrame):
+        name_col_names = self.__class__.sources.get(psql_table_name)
+        if not name_col_names:
+            return
+
+        name_col_name = next((col for col in name_col_names if col in df.columns), None)
+        if not name_col_name:
+            print(f"No autocomplete name column found for PostgreSql table {psql_table_name}.")
+            return
+
+        self.update_table(table_name=psql_table_name, names=self._df_names(df, name_col_name))
+
+    def record_selection(self,
+                         table_name: str,
+                         name: str,
+                         weight: float = 1):
+        with self._lock:
+            key = self.normalize(name)
+            entry_id = self._table_entry_ids.get(table_name, {}).get(key)
+            if entry_id is None:
+                return
+
+            entry = self._entries[entry_id]
+            entry.weight += weight
+            entry.update_sort_key()
+            self._refresh_paths({key})
+
+    @staticmethod
+    def _prefix_distance(query_word: str, word: str, max_typos: int) -> int | None:
+        # Edit distance, counting adjacent transpositions as one edit, between query_word and the closest prefix of
+        # word, None once it is past max_typos
+        prior_row = None
+        previous_row = list(range(len(query_word) + 1))
+        best = previous_row[-1]
+        for j, char in enumerate(word, start=1):
+            row = [j]
+            for i, query_char in enumerate(query_word, start=1):
+                distance = min(
+                    previous_row[i] + 1,
+                    row[i - 1] + 1,
+                    previous_row[i - 1] + (query_char != char)
+                )
+                if prior_row is not None and i > 1 and query_char == word[j - 2] and query_word[i - 2] == char:
+                    distance = min(distance, prior_row[i - 2] + 1)
+                row.append(distance)
+
+            best = min(best, row[-1])
+            if min(row) > max_typos:
+                break
+            prior_row, previous_row = previous_row, row
+
+        return best if best <= max_typos else None
+
+    def _prefix_words(self, query_word: str) -> dict[str, int]:
+        start = bisect.bisect_left(self._words, query_word)
+        end = bisect.bisect_left(self._words, query_word + '\uffff', lo=start)
+        return {word: 0 for word in self._words[start:end]}
+
+    def _fuzzy_words(self, query_word: str) -> dict[str, int]:
+        query_grams = self._word_grams_of(query_word)
+
+        # Each edit changes at most gram_size + 1 grams, a word sharing fewer cannot be within max_typos
+        min_shared_grams = len(query_grams) - (self._gram_size + 1) * self._max_typos
+        if min_shared_grams < 1:
+            return {}
+
+        gram_counts = Counter()
+        for gram in query_grams:
+            gram_counts.update(self._word_grams.get(gram, ()))
+
+        candidates = [
+            word for word, shared_grams in gram_counts.most_common()
+            if shared_grams >= min_shared_grams and len(word) >= len(query_word) - self._max_typos
+        ]
+
+        matches = {}
+        for word in candidates[:self._max_fuzzy_candidates]:
+            distance = self._prefix_distance(query_word, word, self._max_typos)
+            if distance is not None:
+                matches[word] = distance
+        return matches
+
+    def _word_matches(self, query_key: str, fuzzy: bool) -> dict[int, int]:
+        # Every query word has to start a word of the name, fuzzy matching only covers the words that match nothing
+        scored = None
+        for query_word in self._words_of(query_key):
+            words = self._prefix_words(query_word)
+            if not words and fuzzy:
+                words = self._fuzzy_words(query_word)
+            if not words:
+                return {}
+
+            word_scores = {}
+            for word, distance in words.items():
+                for entry_id in self._word_entry_ids[word]:
+                    if entry_id not in word_scores or distance < word_scores[entry_id]:
+                        word_scores[entry_id] = distance
+
+            if scored is None:
+                scored = word_scores
+            else:
+                scored = {
+                    entry_id: distance + word_scores[entry_id]
+                    for entry_id, distance in scored.items() if entry_id in word_scores
+                }
+            if not scored:
+                return {}
+
+        return scored or {}
+
+    def complete(self,
+                 prefix: str,
+                 limit: int = None) -> list[AutocompleteEntry]:
+        limit = min(limit or self._top_k, self._top_k)
+        query_key = self.normalize(prefix)
+        if not query_key:
+            return []
+
+        with self._lock:
+            path = self._walk(query_key)
+            entry_ids = list(path[-1].top[:limit]) if len(path) == len(query_key) + 1 else []
+
+            # Then names with a word starting with the input, and only when those run out too, names within max_typos
+            if len(entry_ids) < limit:
+                scored = self._word_matches(query_key, fuzzy=False)
+                if not scored and not entry_ids and self._max_typos:
+                    scored = self._word_matches(query_key, fuzzy=True)
+
+                for entry_id in entry_ids:
+                    scored.pop(entry_id, None)
+                entry_ids.extend(heapq.nsmallest(
+                    limit - len(entry_ids),
+                    scored,
+                    key=lambda entry_id: (scored[entry_id], self._entries[entry_id].sort_key)
+                ))
+
+            return [self._entries[entry_id] for entry_id in entry_ids]
@@ -0,0 +1,327 @@
+import hashlib
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class SimilarityEngine:
+    _token_pattern = re.compile(r"[a-z]+(?:'[a-z]+)?")
+    _wiki_link_pattern = re.compile(r'\[\[(?:[^\]|]*\|)?([^\]]*)\]\]')
+    _html_tag_pattern = re.compile(r'<[^>]+>')
+
+    def __init__(self,
+                 batch_size: int = 256,
+                 sources: dict[str, tuple[str, str]] = None):
+        self._batch_size = batch_size
+
+        # PostgreSql table -> (id column, text column), read by on_table_update
+        self._sources = dict(sources or {})
+
+        self._ids = []
+        self._id_rows = {}
+        self._vocab = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+
+        self._neighbor_rows = None
+        self._neighbor_scores = None
+
+        # Index id -> fingerprint of the text it was last vectorized from
+        self._text_hashes = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._id_rows)
+
+    @classmethod
+    def _tokenize(cls, text) -> list[str]:
+        if isinstance(text, list):
+            text = ' '.join(t for t in text if isinstance(t, str))
+        if not isinstance(text, str):
+            return []
+
+        text = cls._wiki_link_pattern.sub(r'\1', text)
+        text = cls._html_tag_pattern.sub(' ', text)
+        words = cls._token_pattern.findall(text.lower())
+
+        # Bigrams keep "fire resistance" apart from "fire damage"
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    @staticmethod
+    def _text_hash(text) -> int:
+        return int.from_bytes(hashlib.blake2b(repr(text).encode(), digest_size=8).digest(), 'little')
+
+    @staticmethod
+    def table_sources(table_updaters: list) -> dict[str, tuple[str, str]]:
+        return {
+            table_updater.psql_table_metadata.table_name: (
+                table_updater.psql_table_metadata.id_col_name,
+                table_updater.psql_table_metadata.text_col_name
+            )
+            for table_updater in table_updaters if table_updater.psql_table_metadata.text_col_name
+        }
+
+    def _vectorize(self, texts: list) -> sparse.csr_matrix:
+        rows = []
+        cols = []
+        data = []
+        for row, text in enumerate(texts):
+            term_counts = Counter(self._vocab[token] for token in self._tokenize(text) if token in self._vocab)
+            for col, count in term_counts.items():
+                rows.append(row)
+                cols.append(col)
+                data.append(1 + np.log(count))
+
+        matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float32), (rows, cols)),
+            shape=(len(texts), len(self._vocab)),
+            dtype=np.float32
+        )
+        matrix = matrix.multiply(self._idf).tocsr()
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms, dtype=np.float32) @ matrix)
+
+    def fit(self,
+            index_ids: list[str],
+            texts: list):
+        document_counts = Counter()
+        for text in texts:
+            document_counts.update(set(self._tokenize(text)))
+
+        self._vocab = {term: col for col, term in enumerate(sorted(document_counts))}
+        num_docs = len(texts)
+        self._idf = np.array(
+            [np.log((1 + num_docs) / (1 + document_counts[term])) + 1 for term in self._vocab],
+            dtype=np.float32
+        )
+
+        with self._lock:
+            self._ids = list(index_ids)
+            self._id_rows = {index_id: row for row, index_id in enumerate(self._ids)}
+            self._matrix = self._vectorize(texts)
+            self._text_hashes = {index_id: self._text_hash(text) for index_id, text in zip(index_ids, texts)}
+
+            self._neighbor_rows = None
+            self._neighbor_scores = None
+
+    @classmethod
+    def from_table_updaters(cls,
+                            table_updaters: list,
+                            batch_size: int = 256):
+        index_ids = []
+        texts = []
+        for table_updater in table_updaters:
+            table_updater.insert_into_text_index(index_ids=index_ids, texts=texts)
+
+        engine = cls(batch_size=batch_size, sources=cls.table_sources(table_updaters))
+        engine.fit(index_ids=index_ids, texts=texts)
+        return engine
+
+    def _active_mask(self) -> np.ndarray:
+        mask = np.zeros(len(self._ids), dtype=bool)
+        mask[list(self._id_rows.values())] = True
+        return mask
+
+    def _top_k(self,
+               rows: np.ndarray,
+               k: int) -> tuple[np.ndarray, np.ndarray]:
+        top_rows = np.full((len(rows), k), -1, dtype=np.int32)
+        top_scores = np.zeros((len(rows), k), dtype=np.float32)
+        inactive = ~self._active_mask()
+
+        for start in range(0, len(rows), self._batch_size):
+            batch_rows = rows[start:start + self._batch_size]
+            scores = (self._matrix[batch_rows] @ self._matrix.T).toarray()
+            scores[:, inactive] = -np.inf
+            scores[np.arange(len(batch_rows)), batch_rows] = -np.inf
+
+            batch_k = min(k, scores.shape[1])
+            if not batch_k:
+                continue
+            candidates = np.argpartition(-scores, batch_k - 1, axis=1)[:, :batch_k]
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1)
+
+            batch_top_rows = np.take_along_axis(candidates, order, axis=1)
+            batch_top_scores = np.take_along_axis(candidate_scores, order, axis=1)
+            valid = np.isfinite(batch_top_scores) & (batch_top_scores > 0)
+
+            top_rows[start:start + len(batch_rows), :batch_k] = np.where(valid, batch_top_rows, -1)
+            top_scores[start:start + len(batch_rows), :batch_k] = np.where(valid, batch_top_scores, 0)
+
+        return top_rows, top_scores
+
+    def build_neighbor_table(self,
+                             k: int = 10):
+        with self._lock:
+            self._neighbor_rows, self._neighbor_scores = self._top_k(np.arange(len(self._ids)), k)
+
+    def most_similar(self,
+                     index_ids: list[str],
+                     k: int = 10) -> list[list[tuple[str, float]]]:
+        with self._lock:
+            rows = np.array([self._id_rows[index_id] for index_id in index_ids], dtype=np.int64)
+
+            if self._neighbor_rows is not None and k <= self._neighbor_rows.shape[1]:
+                top_rows = self._neighbor_rows[rows, :k]
+                top_scores = self._neighbor_scores[rows, :k]
+            else:
+                top_rows, top_scores = self._top_k(rows, k)
+
+            return [
+                [(self._ids[row], float(score)) for row, score in zip(row_neighbors, row_scores) if row >= 0]
+                for row_neighbors, row_scores in zip(top_rows, top_scores)
+            ]
+
+    def update(self,
+               index_ids: list[str],
+               texts: list,
+               removed_ids: list[str] = None):
+        # Rows are re-vectorized with the fitted vocabulary and idf, call fit again to pick up new terms
+        with self._lock:
+            latest_texts = dict(zip(index_ids, texts))
+            index_ids = list(latest_texts.keys())
+            texts = list(latest_texts.values())
+
+            new_ids = [index_id for index_id in index_ids if index_id not in self._id_rows]
+            if new_ids:
+                start = len(self._ids)
+                self._ids.extend(new_ids)
+                self._id_rows.update({index_id: start + i for i, index_id in enumerate(new_ids)})
+                self._matrix = sparse.vstack(
+                    [self._matrix, sparse.csr_matrix((len(new_ids), len(self._vocab)), dtype=np.float32)]
+                ).tocsr()
+
+            self._text_hashes.update({index_id: self._text_hash(text) for index_id, text in zip(index_ids, texts)})
+            for index_id in removed_ids or []:
+                self._text_hashes.pop(index_id, None)
+
+            changed_rows = np.array([self._id_rows[index_id] for index_id in index_ids], dtype=np.int64)
+            removed_rows = np.array(
+                [self._id_rows.pop(index_id) for index_id in removed_ids or [] if index_id in self._id_rows],
+                dtype=np.int64
+            )
+
+            # Zero the changed and removed rows, then scatter the new vectors into the changed ones
+            keep = np.ones(len(self._ids), dtype=np.float32)
+            keep[changed_rows] = 0
+            keep[removed_rows] = 0
+            scatter = sparse.csr_matrix(
+                (np.ones(len(changed_rows), dtype=np.float32), (changed_rows, np.arange(len(changed_rows)))),
+                shape=(len(self._ids), len(changed_rows))
+            )
+            self._matrix = sparse.csr_matrix(sparse.diags(keep) @ self._matrix + scatter @ self._vectorize(texts))
+            self._matrix.eliminate_zeros()
+
+            if self._neighbor_rows is not None:
+                self._update_neighbor_table(np.concatenate([changed_rows, removed_rows]), num_new_rows=len(new_ids))
+
+    def _update_neighbor_table(self,
+                               touched_rows: np.ndarray,
+                               num_new_rows: int):
+        k = self._neighbor_rows.shape[1]
+        if num_new_rows:
+            self._neighbor_rows = np.vstack([self._neighbor_rows, np.full((num_new_rows, k), -1, dtype=np.int32)])
+            self._neighbor_scores = np.vstack([self._neighbor_scores, np.zeros((num_new_rows, k), dtype=np.float32)])
+
+        # A row needs recomputing if it lists a touched row or a touched row now beats its weakest neighbor
+        touched_matrix_t = self._matrix[touched_rows].T.tocsc()
+        lists_touched = np.isin(self._neighbor_rows, touched_rows).any(axis=1)
+        beats_weakest = np.zeros(len(self._ids), dtype=bool)
+        for start in range(0, len(self._ids), self._batch_size):
+            end = start + self._batch_size
+            touched_scores = (self._matrix[start:end] @ touched_matrix_t).toarray()
+            beats_weakest[start:end] = (touched_scores > self._neighbor_scores[start:end, -1:]).any(axis=1)
+
+        stale = lists_touched | beats_weakest
+        stale[touched_rows] = True
+        stale &= self._active_mask()
+
+        stale_rows = np.flatnonzero(stale)
+        self._neighbor_rows[stale_rows], self._neighbor_scores[stale_rows] = self._top_k(stale_rows, k)
+
+        inactive_rows = np.flatnonzero(~self._active_mask())
+        self._neighbor_rows[inactive_rows] = -1
+        self._neighbor_scores[inactive_rows] = 0
+
+    def on_table_update(self,
+                        psql_table_name: str,
+                        df: pd.DataFrame):
+        source = self._sources.get(psql_table_name)
+        if not source:
+            return
+        id_col_name, text_col_name = source
+
+        # Same index ids as SimpleTableUpdater.insert_into_text_index
+        latest_texts = dict(zip(
+            (f"{id_}_@{psql_table_name}" for id_ in df[id_col_name]),
+            df[text_col_name]
+        ))
+        suffix = f"_@{psql_table_name}"
+
+        with self._lock:
+            changed_ids = [
+                index_id for index_id, text in latest_texts.items()
+                if self._text_hashes.get(index_id) != self._text_hash(text)
+            ]
+            removed_ids = [
+                index_id for index_id in self._id_rows
+                if index_id.endswith(suffix) and index_id not in latest_texts
+            ]
+            if changed_ids or removed_ids:
+                self.update(
+                    index_ids=changed_ids,
+                    texts=[latest_texts[index_id] for index_id in changed_ids],
+                    removed_ids=removed_ids
+                )
+
+    def save(self,
+             path: str):
+        np.savez_compressed(
+            path,
+            ids=np.array(self._ids, dtype=object),
+            active=self._active_mask(),
+            text_hashes=np.array([self._text_hashes.get(index_id, 0) for index_id in self._ids], dtype=np.uint64),
+            vocab=np.array(list(self._vocab), dtype=object),
+            idf=self._idf,
+            data=self._matrix.data,
+            indices=self._matrix.indices,
+            indptr=self._matrix.indptr,
+            shape=np.array(self._matrix.shape),
+            neighbor_rows=self._neighbor_rows if self._neighbor_rows is not None else np.zeros((0, 0), np.int32),
+            neighbor_scores=self._neighbor_scores if self._neighbor_scores is not None else np.zeros((0, 0), np.float32)
+        )
+
+    @classmethod
+    def load(cls,
+             path: str,
+             batch_size: int = 256,
+             sources: dict[str, tuple[str, str]] = None):
+        engine = cls(batch_size=batch_size, sources=sources)
+        with np.load(path, allow_pickle=True) as saved:
+            # Each NpzFile key access decompresses the array again, read it once
+            active = saved['active']
+            text_hashes = saved['text_hashes'].tolist() if 'text_hashes' in saved.files else [0] * len(active)
+
+            engine._ids = list(saved['ids'])
+            engine._id_rows = {index_id: row for row, index_id in enumerate(engine._ids) if active[row]}
+            engine._text_hashes = {
+                index_id: text_hashes[row] for row, index_id in enumerate(engine._ids) if active[row]
+            }
+            engine._vocab = {term: col for col, term in enumerate(saved['vocab'])}
+            engine._idf = saved['idf']
+            engine._matrix = sparse.csr_matrix(
+                (saved['data'], saved['indices'], saved['indptr']),
+                shape=tuple(saved['shape'])
+            )
+            if saved['neighbor_rows'].size:
+                engine._neighbor_rows = saved['neighbor_rows']
+                engine._neighbor_scores = saved['neighbor_scores']
+
+        return engine
@@ -0,0 +1,206 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class StatTemplateBlock:
+
+    def __init__(self,
+                 table_names: np.ndarray,
+                 ids: np.ndarray,
+                 mins: np.ndarray,
+                 maxs: np.ndarray):
+        self.table_names = table_names
+        self.ids = ids
+
+        # Shape (rows, placeholder slots)
+        self.mins = mins
+        self.maxs = maxs
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class StatTemplateIndex:
+    # PostgreSql table -> stat text column
+    sources = {
+        'mods': 'stat_text',
+        'mastery_effects': 'stat_text_raw',
+        'passive_skills': 'stat_text'
+    }
+    placeholder = '#'
+
+    _wiki_link_pattern = re.compile(r'\[\[(?:[^\]|]*\|)?([^\]]*)\]\]')
+    _html_tag_pattern = re.compile(r'<[^>]+>')
+    _line_break_pattern = re.compile(r'<br\s*/?>|\n')
+    # html.unescape turns the wiki's &ndash; ranges into en dashes
+    _value_pattern = re.compile(
+        r'\(\s*(-?\d+(?:\.\d+)?)\s*[-\u2013\u2014]\s*(-?\d+(?:\.\d+)?)\s*\)'
+        r'|((?:(?<![\w)])-)?\d+(?:\.\d+)?)'
+    )
+
+    def __init__(self):
+        # template -> table -> (ids, mins, maxs) as lists until the block is built
+        self._records = {}
+        self._table_templates = {}
+        self._blocks = {}
+
+        # Updates run on the writer thread while readers query the blocks
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._records)
+
+    @classmethod
+    def _clean_text(cls, stat_text: str) -> str:
+        stat_text = cls._wiki_link_pattern.sub(r'\1', stat_text)
+        stat_text = cls._html_tag_pattern.sub('', stat_text)
+        return re.sub(r'\s+', ' ', stat_text).strip()
+
+    @classmethod
+    def normalize(cls, stat_text: str) -> tuple[str, list[float], list[float]]:
+        mins = []
+        maxs = []
+
+        def replace_value(match: re.Match) -> str:
+            if match.group(3) is not None:
+                value = float(match.group(3))
+                mins.append(value)
+                maxs.append(value)
+            else:
+                bounds = sorted((float(match.group(1)), float(match.group(2))))
+                mins.append(bounds[0])
+                maxs.append(bounds[1])
+            return cls.placeholder
+
+        # A literal placeholder in the text is escaped so it is never taken for a value slot
+        stat_text = cls._clean_text(stat_text).replace(cls.placeholder, '\\' + cls.placeholder)
+        template = cls._value_pattern.sub(replace_value, stat_text)
+        return template, mins, maxs
+
+    @staticmethod
+    def _unwrap(value):
+        # Formatted wiki cells are single element lists
+        if isinstance(value, list) and len(value) == 1:
+            return value[0]
+        return value
+
+    @classmethod
+    def _stat_lines(cls, stat_text) -> list[str]:
+        texts = stat_text if isinstance(stat_text, list) else [stat_text]
+        return [
+            line
+            for text in texts if isinstance(text, str)
+            for line in cls._line_break_pattern.split(text) if line.strip()
+        ]
+
+    def _build_block(self, template: str):
+        table_records = self._records.get(template)
+        if not table_records:
+            self._records.pop(template, None)
+            self._blocks.pop(template, None)
+            return
+
+        table_names = []
+        ids = []
+        mins = []
+        maxs = []
+        for table_name, (table_ids, table_mins, table_maxs) in table_records.items():
+            table_names.extend([table_name] * len(table_ids))
+            ids.extend(table_ids)
+            mins.extend(table_mins)
+            maxs.extend(table_maxs)
+
+        shape = (len(ids), len(mins[0]))
+        self._blocks[template] = StatTemplateBlock(
+            table_names=np.array(table_names, dtype=object),
+            ids=np.array(ids, dtype=object),
+            mins=np.array(mins, dtype=np.float32).reshape(shape),
+            maxs=np.array(maxs, dtype=np.float32).reshape(shape)
+        )
+
+    def update_table(self,
+                     table_name: str,
+                     ids: list,
+                     stat_texts: list):
+        table_records = {}
+        for id_, stat_text in zip(ids, stat_texts):
+            id_ = self._unwrap(id_)
+            for line in self._stat_lines(stat_text):
+                template, mins, maxs = self.normalize(line)
+                template_ids, template_mins, template_maxs = table_records.setdefault(template, ([], [], []))
+                template_ids.append(id_)
+                template_mins.append(mins)
+                template_maxs.append(maxs)
+
+        # Parsing needs no lock, only swapping the records and blocks does
+        with self._lock:
+            old_templates = self._table_templates.get(table_name, set())
+            for template in old_templates - table_records.keys():
+                self._records[template].pop(table_name, None)
+
+            for template, records in table_records.items():
+                self._records.setdefault(template, {})[table_name] = records
+
+            self._table_templates[table_name] = set(table_records.keys())
+            for template in old_templates | table_records.keys():
+                self._build_block(template)
+
+    def on_table_update(self,
+                        psql_table_name: str,
+                        df: pd.DataFrame):
+        text_col_name = self.__class__.sources.get(psql_table_name)
+        if not text_col_name:
+            return
+
+        self.update_table(
+            table_name=psql_table_name,
+            ids=list(df['id']),
+            stat_texts=list(df[text_col_name])
+        )
+
+    def templates(self,
+                  contains: str = None) -> list[str]:
+        with self._lock:
+            if not contains:
+                return list(self._blocks.keys())
+
+            contains = contains.casefold()
+            return [template for template in self._blocks if contains in template.casefold()]
+
+    def members(self,
+                template: str) -> list[tuple[str, str]]:
+        with self._lock:
+            block = self._blocks.get(template)
+        if block is None:
+            return []
+        return list(zip(block.table_names, block.ids))
+
+    def filter(self,
+               template: str,
+               min_value: float = None,
+               max_value: float = None,
+               slot: int = 0,
+               table_names: set[str] = None) -> list[tuple[str, str]]:
+        # Rows whose value range for the slot overlaps [min_value, max_value]
+        if template not in self._blocks and self.placeholder not in template:
+            template = self.normalize(template)[0]
+
+        with self._lock:
+            block = self._blocks.get(template)
+        if block is None or not len(block):
+            return []
+        if slot >= block.mins.shape[1]:
+            raise ValueError(f"Template '{template}' has {block.mins.shape[1]} values, no value at slot {slot}.")
+
+        mask = np.ones(len(block), dtype=bool)
+        if min_value is not None:
+            mask &= block.maxs[:, slot] >= min_value
+        if max_value is not None:
+            mask &= block.mins[:, slot] <= max_value
+        if table_names:
+            mask &= np.isin(block.table_names, list(table_names))
+
+        return list(zip(block.table_names[mask], block.ids[mask]))
@@ -0,0 +1,129 @@
+import cProfile
+import functools
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimings:
+
+    def __init__(self):
+        # stage name -> [calls, total seconds, max seconds]
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        self._profile_dir = None
+
+        # stage name -> one profiler per thread that ran the stage, merged when dumped
+        self._profiles = {}
+        self._skipped_profiles = {}
+        self._thread_profiles = threading.local()
+
+    def enable_profiling(self,
+                         profile_dir: str):
+        os.makedirs(profile_dir, exist_ok=True)
+        self._profile_dir = profile_dir
+
+    def _thread_state(self):
+        if not hasattr(self._thread_profiles, "profiles"):
+            self._thread_profiles.profiles = {}
+            self._thread_profiles.stack = []
+        return self._thread_profiles
+
+    def _start_profile(self, stage_name: str) -> cProfile.Profile | None:
+        if not self._profile_dir:
+            return None
+
+        # Profilers are per thread, so stages running concurrently on other threads are each captured
+        state = self._thread_state()
+        profile = state.profiles.get(stage_name)
+        if profile is None:
+            profile = state.profiles[stage_name] = cProfile.Profile()
+            with self._lock:
+                self._profiles.setdefault(stage_name, []).append(profile)
+
+        # A thread runs one profiler at a time, a nested stage pauses the enclosing one until it ends
+        if state.stack:
+            state.stack[-1].disable()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one profiler per process, this call is timed but not profiled
+            with self._lock:
+                self._skipped_profiles[stage_name] = self._skipped_profiles.get(stage_name, 0) + 1
+            if state.stack:
+                state.stack[-1].enable()
+            return None
+
+        state.stack.append(profile)
+        return profile
+
+    def _stop_profile(self, profile: cProfile.Profile | None):
+        if profile is None:
+            return
+
+        profile.disable()
+        state = self._thread_state()
+        state.stack.pop()
+        if state.stack:
+            state.stack[-1].enable()
+
+    @contextmanager
+    def stage(self,
+              stage_name: str):
+        profile = self._start_profile(stage_name)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self._stop_profile(profile)
+
+            with self._lock:
+                stats = self._stats.setdefault(stage_name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+    def dump_profiles(self) -> list[str]:
+        with self._lock:
+            profiles = {stage_name: list(stage_profiles) for stage_name, stage_profiles in self._profiles.items()}
+            skipped_profiles = dict(self._skipped_profiles)
+
+        paths = []
+        for stage_name, stage_profiles in profiles.items():
+            stats = pstats.Stats(*stage_profiles)
+            path = os.path.join(self._profile_dir, f"{stage_name}.prof")
+            stats.dump_stats(path)
+            paths.append(path)
+
+        for stage_name, num_skipped in skipped_profiles.items():
+            print(f"Warning: {num_skipped} calls of stage {stage_name} overlapped another profiled stage "
+                  f"and are missing from its profile.")
+        return paths
+
+    def summary(self) -> str:
+        with self._lock:
+            stats = {stage_name: list(stage_stats) for stage_name, stage_stats in self._stats.items()}
+
+        lines = [f"{'stage':<16}{'calls':>8}{'total (s)':>12}{'mean (ms)':>12}{'max (ms)':>12}"]
+        for stage_name, (calls, total, max_elapsed) in sorted(stats.items(), key=lambda item: -item[1][1]):
+            lines.append(
+                f"{stage_name:<16}{calls:>8}{total:>12.3f}{total / calls * 1000:>12.2f}{max_elapsed * 1000:>12.2f}"
+            )
+        return "\n".join(lines)
+
+
+timings = StageTimings()
+
+
+def timed(stage_name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timings.stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,244 @@
+import queue
+import sys
+import threading
+import traceback
+from typing import Callable
+
+import pandas as pd
+
+from .table_updates import SimpleTableUpdater
+from .updates import Updater
+from ..timing import timings
+from ..wiki_api.icons import IconMirror
+
+
+class MemoryBudget:
+
+    def __init__(self,
+                 max_bytes: int):
+        self._max_bytes = max_bytes
+        self._used_bytes = 0
+        self._retained_bytes = 0
+        self._largest_bytes = 0
+        self._peak_bytes = 0
+        self._sizing = False
+        self._condition = threading.Condition()
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used_bytes
+
+    @property
+    def peak_bytes(self) -> int:
+        return self._peak_bytes
+
+    def _has_headroom(self) -> bool:
+        if not self._largest_bytes:
+            # No table has been measured yet, so one fetch runs alone to size them
+            return self._used_bytes == self._retained_bytes and not self._sizing
+
+        # An empty pipeline always admits one table, even one larger than the budget
+        return self._used_bytes == self._retained_bytes or self._used_bytes + self._largest_bytes <= self._max_bytes
+
+    def reserve(self) -> int:
+        # Waiting and reserving happen under one lock, so concurrent fetches cannot all pass the same headroom
+        with self._condition:
+            self._condition.wait_for(self._has_headroom)
+            if not self._largest_bytes:
+                self._sizing = True
+
+            self._used_bytes += self._largest_bytes
+            self._peak_bytes = max(self._peak_bytes, self._used_bytes)
+            return self._largest_bytes
+
+    def settle(self,
+               reserved_bytes: int,
+               num_bytes: int):
+        # Swaps what a table holds for its measured size, settling to 0 releases it
+        with self._condition:
+            self._sizing = False
+            self._used_bytes += num_bytes - reserved_bytes
+            self._largest_bytes = max(self._largest_bytes, num_bytes)
+            self._peak_bytes = max(self._peak_bytes, self._used_bytes)
+            self._condition.notify_all()
+
+    def retain(self,
+               num_bytes: int):
+        # Charges output the pipeline keeps until the run ends, it is never released
+        with self._condition:
+            self._retained_bytes += num_bytes
+            self._used_bytes += num_bytes
+            self._peak_bytes = max(self._peak_bytes, self._used_bytes)
+
+
+class _TableJob:
+
+    def __init__(self,
+                 table_updater: SimpleTableUpdater):
+        self.table_updater = table_updater
+        self.df = None
+        self.num_bytes = 0
+
+    @property
+    def table_name(self) -> str:
+        return self.table_updater.psql_table_metadata.table_name
+
+
+class UpdatePipeline:
+    _stop = object()
+
+    def __init__(self,
+                 updater: Updater,
+                 max_memory_bytes: int = 512 * 1024**2,
+                 queue_size: int = 2,
+                 fetch_workers: int = 2,
+                 enrich_workers: int = 2,
+                 icon_mirror: IconMirror = None,
+                 text_index_consumer: Callable[[list, list], None] = None):
+        self._updater = updater
+        self._budget = MemoryBudget(max_memory_bytes)
+        self._queue_size = queue_size
+        self._fetch_workers = fetch_workers
+        self._enrich_workers = enrich_workers
+        self._icon_mirror = icon_mirror
+
+        # Receives each table's text index contribution as it is written, without one it is collected for the whole
+        # run and charged to the budget
+        self._text_index_consumer = text_index_consumer
+
+        self.index_ids = []
+        self.texts = []
+        self.failures = {}
+
+    @property
+    def peak_memory_bytes(self) -> int:
+        return self._budget.peak_bytes
+
+    @staticmethod
+    def _df_bytes(df: pd.DataFrame) -> int:
+        num_bytes = int(df.memory_usage(deep=True).sum())
+
+        # Formatted cells are lists, memory_usage counts the lists but not the values inside them
+        for col_name in df.columns[df.dtypes == object]:
+            num_bytes += sum(
+                sys.getsizeof(value)
+                for cell in df[col_name] if isinstance(cell, list)
+                for value in cell
+            )
+        return num_bytes
+
+    @staticmethod
+    def _text_index_bytes(index_ids: list,
+                          texts: list) -> int:
+        # Two list slots per row, plus the ids and texts themselves
+        num_bytes = 16 * len(index_ids) + sum(sys.getsizeof(id_) for id_ in index_ids)
+        for text in texts:
+            num_bytes += sys.getsizeof(text)
+            if isinstance(text, list):
+                num_bytes += sum(sys.getsizeof(value) for value in text)
+        return num_bytes
+
+    def _resize(self,
+                job: _TableJob,
+                num_bytes: int):
+        self._budget.settle(job.num_bytes, num_bytes)
+        job.num_bytes = num_bytes
+
+    def _fail(self, job: _TableJob):
+        print(f"Pipeline failed for PostgreSql table {job.table_name}.")
+        self.failures[job.table_name] = traceback.format_exc()
+
+        job.df = None
+        job.table_updater.release_df()
+        self._resize(job, 0)
+
+    def _fetch(self, job: _TableJob) -> _TableJob:
+        job.num_bytes = self._budget.reserve()
+        job.df = job.table_updater.fetch_df()
+
+        # The raw pages and the DataFrame are both held at the end of a fetch, only the DataFrame after it
+        self._resize(job, job.table_updater.raw_bytes + self._df_bytes(job.df))
+        self._resize(job, self._df_bytes(job.df))
+        return job
+
+    def _format(self, job: _TableJob) -> _TableJob:
+        # Stages can grow or shrink the DataFrame, keep the budget in step with it
+        job.df = job.table_updater.format_df(job.df)
+        self._resize(job, self._df_bytes(job.df))
+        return job
+
+    def _enrich(self, job: _TableJob) -> _TableJob:
+        with timings.stage('enrich'):
+            job.df = job.table_updater.enrich_df(job.df, icon_mirror=self._icon_mirror)
+        self._resize(job, self._df_bytes(job.df))
+        return job
+
+    def _write(self, job: _TableJob) -> None:
+        job.table_updater.write_df(self._updater, job.df)
+
+        # Take the text index contribution, then drop every reference to the DataFrame
+        index_ids, texts = [], []
+        job.table_updater.insert_into_text_index(index_ids=index_ids, texts=texts)
+        if self._text_index_consumer:
+            self._text_index_consumer(index_ids, texts)
+        elif index_ids:
+            self._budget.retain(self._text_index_bytes(index_ids, texts))
+            self.index_ids.extend(index_ids)
+            self.texts.extend(texts)
+
+        job.table_updater.release_df()
+        job.df = None
+        self._resize(job, 0)
+
+    def _stage_worker(self,
+                      stage_func,
+                      in_queue: queue.Queue,
+                      out_queue: queue.Queue | None):
+        while True:
+            job = in_queue.get()
+            if job is self._stop:
+                return
+
+            try:
+                job = stage_func(job)
+            except Exception:
+                self._fail(job)
+                continue
+
+            if out_queue is not None:
+                # Blocks while the next stage is behind, which holds back this stage
+                out_queue.put(job)
+
+    def run(self,
+            table_updaters: list[SimpleTableUpdater]):
+        stages = [
+            (self._fetch, self._fetch_workers),
+            (self._format, 1),
+            (self._enrich, self._enrich_workers),
+            (self._write, 1)
+        ]
+
+        # Table jobs are all queued up front, they hold no data until fetched
+        queues = [queue.Queue()] + [queue.Queue(maxsize=self._queue_size) for _ in stages[1:]]
+        for table_updater in table_updaters:
+            queues[0].put(_TableJob(table_updater))
+
+        stage_threads = []
+        for i, (stage_func, num_workers) in enumerate(stages):
+            out_queue = queues[i + 1] if i + 1 < len(stages) else None
+            threads = [
+                threading.Thread(target=self._stage_worker, args=(stage_func, queues[i], out_queue), daemon=True)
+                for _ in range(num_workers)
+            ]
+            for thread in threads:
+                thread.start()
+            stage_threads.append(threads)
+
+        # Stop each stage once the one before it has drained
+        for i, threads in enumerate(stage_threads):
+            for _ in threads:
+                queues[i].put(self._stop)
+            for thread in threads:
+                thread.join()
+
+        return self.index_ids, self.texts
@@ -4,6 +4,7 @@ import pandas as pd
 
 from .updates import Updater, WikiTablePull, WikiApiFormatting, PsqlTableMetaData, WikiTableMetaData
 from ..psql.manager import PsqlManager
+from ..wiki_api.icons import IconMirror
 from ..wiki_api.pull import WikiImageUrlPull
 
 
@@ -16,22 +17,44 @@ class SimpleTableUpdater(ABC):
         self._wiki_meta = wiki_table_metadata
 
         self._psql_df = None
+        self._raw_bytes = 0
+
+    @property
+    def psql_table_metadata(self) -> PsqlTableMetaData:
+        return self._psql_meta
+
+    @property
+    def wiki_table_metadata(self) -> WikiTableMetaData:
+        return self._wiki_meta
+
+    @property
+    def raw_bytes(self) -> int:
+        # Size of the raw wiki pages behind the last fetch, they are held until the DataFrame is built
+        return self._raw_bytes
 
     def _format_df_for_upsert(self, df: pd.DataFrame) -> pd.DataFrame:
         return df
 
     def _fetch_formatted_wiki_dataframe(self) -> pd.DataFrame:
-        data = WikiTablePull(
+        pull = WikiTablePull(
             table_name=self._wiki_meta.table_name,
             fields=self._wiki_meta.fields
-        ).fetch_table_data()
+        )
+        data = pull.fetch_table_data()
+        self._raw_bytes = pull.num_bytes
+
         df = WikiApiFormatting.format_api_data(data)
         return df
 
-    def upsert(self, updater: Updater):
-        df = self._fetch_formatted_wiki_dataframe()
-        df = self._format_df_for_upsert(df)
+    def fetch_df(self) -> pd.DataFrame:
+        return self._fetch_formatted_wiki_dataframe()
 
+    def format_df(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self._format_df_for_upsert(df)
+
+    def enrich_df(self,
+                  df: pd.DataFrame,
+                  icon_mirror: IconMirror = None) -> pd.DataFrame:
         image_col_name = self._wiki_meta.image_file_col_name
         if image_col_name:
             df[image_col_name] = df[image_col_name].apply(
@@ -39,6 +62,16 @@ class SimpleTableUpdater(ABC):
                 if file_name else None
             )
 
+        if icon_mirror:
+            url_col_name = 'image_file_name' if 'image_file_name' in df.columns else image_col_name
+            if url_col_name:
+                df = icon_mirror.mirror_column(df, url_col_name=url_col_name)
+
+        return df
+
+    def write_df(self,
+                 updater: Updater,
+                 df: pd.DataFrame):
         updater.update_sql(
             wiki_df=df,
             psql_table_metadata=self._psql_meta
@@ -46,6 +79,17 @@ class SimpleTableUpdater(ABC):
 
         self._psql_df = df
 
+    def release_df(self):
+        self._psql_df = None
+
+    def upsert(self,
+               updater: Updater,
+               icon_mirror: IconMirror = None):
+        df = self.fetch_df()
+        df = self.format_df(df)
+        df = self.enrich_df(df, icon_mirror=icon_mirror)
+        self.write_df(updater, df)
+
     def insert_into_text_index(self,
                                index_ids: list,
                                texts: list):
@@ -73,7 +117,7 @@ class SkillsSimpleTableUpdater(SimpleTableUpdater):
             ),
             psql_table_metadata=PsqlTableMetaData(
                 table_name='skills',
-                fields=['skill_name', 'image_file_name', 'id', 'skill_text'],
+                fields=['skill_name', 'image_file_name', 'image_local_path', 'id', 'skill_text'],
                 id_col_name='id'
             )
         )
@@ -146,18 +190,21 @@ class ModsSimpleTable(SimpleTableUpdater):
 
 
 class ItemBuffsSimpleTable(SimpleTableUpdater):
-    super().__init__(
-        wiki_table_metadata=WikiTableMetaData(
-            table_name='item_buffs',
-            fields=['buff_values', 'id', 'stat_text', 'icon'],
-            image_file_col_name='icon'
-        ),
-        psql_table_metadata=PsqlTableMetaData(
-            table_name='item_buffs',
-            fields=['buff_values', 'id', 'stat_text', 'image_file_name'],
-            id_col_name='id'
+
+    def __init__(self):
+        super().__init__(
+            wiki_table_metadata=WikiTableMetaData(
+                table_name='item_buffs',
+                fields=['buff_values', 'id', 'stat_text', 'icon'],
+                image_file_col_name='icon'
+            ),
+            psql_table_metadata=PsqlTableMetaData(
+                table_name='item_buffs',
+                fields=['buff_values', 'id', 'stat_text', 'image_file_name', 'image_local_path'],
+                id_col_name='id',
+                text_col_name='stat_text'
+            )
         )
-    )
 
 
 class CorpseItemsSimpleTable(SimpleTableUpdater):
@@ -170,7 +217,7 @@ class CorpseItemsSimpleTable(SimpleTableUpdater):
             ),
             psql_table_metadata=PsqlTableMetaData(
                 table_name='corpse_items',
-                fields=['item_name', 'monster_abilities', 'image_file_name'],
+                fields=['item_name', 'monster_abilities', 'image_file_name', 'image_local_path'],
                 id_col_name='item_name',
                 text_col_name='monster_abilities'
             )
@@ -242,7 +289,7 @@ class PassiveSkillsSimpleTable(SimpleTableUpdater):
             ),
             psql_table_metadata=PsqlTableMetaData(
                 table_name='passive_skills',
-                fields=['id', 'name', 'stat_text', 'image_file_name'],
+                fields=['id', 'name', 'stat_text', 'image_file_name', 'image_local_path'],
                 id_col_name='id',
                 text_col_name='stat_text'
             )
@@ -285,11 +332,23 @@ class CraftingModsSimpleTable(SimpleTableUpdater):
 
 
 class SourceTablesUpdater:
+    table_names = ['mod_id_sources', 'skill_id_sources']
 
     def __init__(self,
                  updater: Updater):
         self._updater = updater
 
+    def update_table(self,
+                     psql_table_name: str):
+        update_funcs = {
+            'mod_id_sources': self._update_mod_id_sources,
+            'skill_id_sources': self._update_skill_id_sources
+        }
+        if psql_table_name not in update_funcs:
+            raise ValueError(f"No source table update exists for PostgreSql table {psql_table_name}.")
+
+        update_funcs[psql_table_name]()
+
     @staticmethod
     def _extend_sources(name: str,
                         insert_values: list,
@@ -377,3 +436,17 @@ class SourceTablesUpdater:
             )
         )
 
+
+# Keyed by the PostgreSql table each updater writes to
+simple_table_updaters = {
+    'skills': SkillsSimpleTableUpdater,
+    'skill_qualities': SkillQualitiesSimpleTable,
+    'item_stats': ItemStatsSimpleTable,
+    'mods': ModsSimpleTable,
+    'item_buffs': ItemBuffsSimpleTable,
+    'corpse_items': CorpseItemsSimpleTable,
+    'pantheon_souls': PantheonSoulsSimpleTable,
+    'mastery_effects': MasteryEffectsSimpleTable,
+    'passive_skills': PassiveSkillsSimpleTable,
+    'crafting_mods': CraftingModsSimpleTable
+}
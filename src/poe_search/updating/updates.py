@@ -2,8 +2,9 @@ import html
 import re
 import pandas as pd
 
-from src.poe_search.wiki_api.pull import WikiTablePull, WikiImageUrlPull
-from src.poe_search.psql.manager import PsqlManager
+from ..wiki_api.pull import WikiTablePull, WikiImageUrlPull
+from ..psql.manager import PsqlManager
+from ..timing import timed
 
 
 class PsqlTableMetaData:
@@ -50,6 +51,7 @@ class WikiApiFormatting:
         return s
 
     @classmethod
+    @timed('format')
     def format_api_data(
             cls,
             data: list
@@ -77,6 +79,11 @@ class Updater:
                  psql_manager: PsqlManager):
         self._psql_manager = psql_manager
 
+        self._table_update_listeners = []
+
+    def add_table_update_listener(self, listener):
+        self._table_update_listeners.append(listener)
+
     @staticmethod
     def _insert_sources(name: str,
                         insert_values: list,
@@ -182,11 +189,23 @@ class Updater:
         new_hash = self._psql_manager.hash_df(wiki_df)
 
         if old_hash != new_hash:
+            # Fields added after a table was created, such as image_local_path, are added to its schema here
+            for col_name in psql_table_metadata.fields:
+                if col_name in wiki_df.columns:
+                    self._psql_manager.add_column(psql_table_name=psql_table_metadata.table_name, col_name=col_name)
+
             self._psql_manager.update_table(
                 psql_table_name=psql_table_metadata.table_name,
                 new_df=wiki_df,
                 id_col_name=psql_table_metadata.id_col_name
             )
+            self._psql_manager.update_table_hash(
+                df_hash=new_hash,
+                psql_table_name=psql_table_metadata.table_name
+            )
+
+            for listener in self._table_update_listeners:
+                listener(psql_table_metadata.table_name, wiki_df)
 
     def update(self):
         self._update_skills()
@@ -0,0 +1,104 @@
+import os
+import socket
+import threading
+import time
+import traceback
+
+from .table_updates import SourceTablesUpdater, simple_table_updaters
+from .updates import Updater
+from ..psql.jobs import PsqlJobQueue
+from ..psql.mod_lookup import ModLookupView
+from ..wiki_api.icons import IconMirror
+
+
+class RefreshWorker:
+
+    def __init__(self,
+                 job_queue: PsqlJobQueue,
+                 updater: Updater,
+                 worker_id: str = None,
+                 heartbeat_seconds: float = 15,
+                 poll_seconds: float = 2,
+                 refresh_id: str = None,
+                 icon_mirror: IconMirror = None,
+                 mod_lookup_view: ModLookupView = None):
+        self._job_queue = job_queue
+        self._updater = updater
+        self._worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._heartbeat_seconds = heartbeat_seconds
+        self._poll_seconds = poll_seconds
+
+        # Limits the worker to the jobs of one refresh, None works through every refresh
+        self._refresh_id = refresh_id
+        self._icon_mirror = icon_mirror
+        self._mod_lookup_view = mod_lookup_view
+
+    @staticmethod
+    def all_job_names() -> list[str]:
+        return list(simple_table_updaters.keys()) + SourceTablesUpdater.table_names
+
+    def _run_job(self,
+                 job_name: str):
+        if job_name in simple_table_updaters:
+            simple_table_updaters[job_name]().upsert(self._updater, icon_mirror=self._icon_mirror)
+        else:
+            SourceTablesUpdater(self._updater).update_table(job_name)
+
+    def _send_heartbeats(self,
+                         job_id: int,
+                         stop_event: threading.Event):
+        while not stop_event.wait(self._heartbeat_seconds):
+            if not self._job_queue.heartbeat(job_id=job_id, worker_id=self._worker_id):
+                print(f"Worker {self._worker_id} lost job {job_id} to another worker.")
+                return
+
+    def _process(self,
+                 job_id: int,
+                 job_name: str):
+        stop_event = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=self._send_heartbeats,
+            args=(job_id, stop_event),
+            daemon=True
+        )
+        heartbeat_thread.start()
+
+        try:
+            self._run_job(job_name)
+        except Exception:
+            print(f"Worker {self._worker_id} failed job {job_id} ({job_name}).")
+            self._job_queue.fail(job_id=job_id, worker_id=self._worker_id, error=traceback.format_exc())
+            return
+        finally:
+            stop_event.set()
+            heartbeat_thread.join()
+
+        # Upserts are idempotent, so a job finished by a worker that was taken over is harmless
+        if not self._job_queue.complete(job_id=job_id, worker_id=self._worker_id):
+            print(f"Worker {self._worker_id} finished job {job_id} ({job_name}) after it was taken over.")
+
+        if self._mod_lookup_view and job_name in ModLookupView.input_table_names:
+            self._refresh_mod_lookup_view()
+
+    def _refresh_mod_lookup_view(self):
+        # The view is only refreshed when its input table hashes moved, so finishing an unchanged table is cheap.
+        # Creating it fails until every input table exists, a later input job retries
+        try:
+            self._mod_lookup_view.create()
+            self._mod_lookup_view.refresh_if_stale()
+        except Exception:
+            print(f"Worker {self._worker_id} failed to refresh {ModLookupView.view_name}.\n{traceback.format_exc()}")
+
+    def run(self,
+            exit_when_idle: bool = True):
+        while True:
+            claimed = self._job_queue.claim(worker_id=self._worker_id, refresh_id=self._refresh_id)
+            if not claimed:
+                if exit_when_idle and self._job_queue.count_unfinished(refresh_id=self._refresh_id) == 0:
+                    return
+                time.sleep(self._poll_seconds)
+                continue
+
+            job_id, job_name = claimed
+            print(f"Worker {self._worker_id} claimed job {job_id} ({job_name}).")
+            self._process(job_id=job_id, job_name=job_name)
@@ -0,0 +1,170 @@
+
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+import pandas as pd
+import requests
+
+from .pull import WikiTablePull
+
+
+class IconMirror:
+
+    def __init__(self,
+                 store_dir: str,
+                 max_workers: int = 8,
+                 request_timeout_seconds: float = 30,
+                 max_attempts: int = 3):
+        self._store_dir = store_dir
+        self._objects_dir = os.path.join(store_dir, "objects")
+        self._manifest_path = os.path.join(store_dir, "manifest.json")
+        self._max_workers = max_workers
+        self._request_timeout_seconds = request_timeout_seconds
+        self._max_attempts = max_attempts
+
+        os.makedirs(self._objects_dir, exist_ok=True)
+
+        # url -> {etag, last_modified, content_hash, path}
+        self._manifest = self._load_manifest()
+        self._manifest_lock = threading.Lock()
+        self._sessions = threading.local()
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self._manifest_path):
+            return {}
+        with open(self._manifest_path, "r", encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    def _save_manifest(self):
+        with self._manifest_lock:
+            manifest = dict(self._manifest)
+        self._write_atomic(self._manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+    @staticmethod
+    def _write_atomic(path: str, content: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @property
+    def _session(self) -> requests.Session:
+        # Sessions are not shared between worker threads
+        if not hasattr(self._sessions, "session"):
+            self._sessions.session = requests.Session()
+            self._sessions.session.headers.update(WikiTablePull._headers)
+        return self._sessions.session
+
+    @staticmethod
+    def _file_extension(url: str, content_type: str) -> str:
+        extension = os.path.splitext(unquote(urlparse(url).path))[1].lower()
+        if extension:
+            return extension
+        return mimetypes.guess_extension((content_type or "").split(";")[0].strip()) or ""
+
+    def _store(self, content: bytes, extension: str) -> tuple[str, str]:
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self._objects_dir, content_hash[:2], f"{content_hash}{extension}")
+
+        # Identical images share one file
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_atomic(path, content)
+
+        return content_hash, path
+
+    def _conditional_headers(self, entry: dict) -> dict:
+        if not entry or not os.path.exists(entry["path"]):
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _download(self, url: str) -> str:
+        with self._manifest_lock:
+            entry = self._manifest.get(url)
+
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                response = self._session.get(
+                    url,
+                    headers=self._conditional_headers(entry),
+                    timeout=self._request_timeout_seconds
+                )
+                if response.status_code == 304:
+                    return entry["path"]
+                response.raise_for_status()
+                break
+            except Exception as err:
+                print(f"Encountered error while downloading icon {url} (attempt {attempts}).")
+                if attempts >= self._max_attempts:
+                    raise err
+                time.sleep(0.05 * 1.5**attempts)
+
+        content_hash, path = self._store(
+            content=response.content,
+            extension=self._file_extension(url, response.headers.get("Content-Type"))
+        )
+        with self._manifest_lock:
+            self._manifest[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": content_hash,
+                "path": path
+            }
+
+        return path
+
+    def _try_download(self, url: str) -> str | None:
+        try:
+            return self._download(url)
+        except Exception:
+            print(f"Failed to mirror icon {url}.")
+            return None
+
+    def mirror(self,
+               urls: list[str]) -> dict[str, str | None]:
+        unique_urls = list(dict.fromkeys(url for url in urls if isinstance(url, str) and url))
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            paths = dict(zip(unique_urls, executor.map(self._try_download, unique_urls)))
+
+        self._save_manifest()
+        return paths
+
+    def mirror_column(self,
+                      df: pd.DataFrame,
+                      url_col_name: str,
+                      path_col_name: str = "image_local_path") -> pd.DataFrame:
+        paths = self.mirror(list(df[url_col_name]))
+
+        df = df.drop(columns=[path_col_name], errors="ignore")
+        # An object column keeps missing paths as None, a string column would turn them into NaN
+        df.insert(
+            df.columns.get_loc(url_col_name) + 1,
+            path_col_name,
+            pd.Series(
+                [paths.get(url) if isinstance(url, str) else None for url in df[url_col_name]],
+                index=df.index,
+                dtype=object
+            )
+        )
+        return df
@@ -1,7 +1,10 @@
 
+import sys
 import time
 import requests
 
+from ..timing import timed
+
 
 class WikiTablePull:
     _headers = {
@@ -25,6 +28,7 @@ class WikiTablePull:
         self._successfull_loops = 0
 
         self._data = []
+        self._num_bytes = 0
 
     def __str__(self):
         return (
@@ -38,6 +42,20 @@ class WikiTablePull:
             f"\n\tSuccessful loops: {self._successfull_loops}"
         )
 
+    @property
+    def num_bytes(self) -> int:
+        # Memory held by the parsed pages in _data
+        return self._num_bytes
+
+    @staticmethod
+    def _page_bytes(page_data: list) -> int:
+        # Parsed records take several times their JSON size, so size the objects themselves
+        return sum(
+            sys.getsizeof(record) + sys.getsizeof(record['title'])
+            + sum(sys.getsizeof(value) for value in record['title'].values())
+            for record in page_data
+        )
+
     @property
     def _pull_params(self):
         return {
@@ -58,6 +76,7 @@ class WikiTablePull:
 
         return time_after_backoff_length > mandatory_exit_time
 
+    @timed('pull')
     def fetch_table_data(self):
         self._pull_start_time = time.time()
 
@@ -82,6 +101,7 @@ class WikiTablePull:
                 continue
             page_data = response.json()['cargoquery']
             self._data.extend(page_data)
+            self._num_bytes += self._page_bytes(page_data)
             num_results = len(page_data)
             self._request_offset += num_results
 
@@ -133,6 +153,7 @@ class WikiImageUrlPull:
 
         return time_after_backoff_length > mandatory_exit_time
 
+    @timed('image_url')
     def fetch_image_url(self):
         self._pull_start_time = time.time()
         while True:
@@ -0,0 +1,106 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from poe_search.wiki_api.icons import IconMirror
+
+_icons = {
+    "/images/fireball.png": b"fireball icon",
+    "/images/firestorm.png": b"firestorm icon",
+    # Same bytes under another name, stored once
+    "/images/fireball_copy.png": b"fireball icon"
+}
+
+
+class _IconHandler(BaseHTTPRequestHandler):
+    # Stand-in for the wiki image host, answers conditional requests with 304
+    requests_by_status = {}
+
+    def do_GET(self):
+        content = _icons.get(self.path)
+        if content is None:
+            self._respond(404)
+            return
+
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._respond(304)
+            return
+
+        self._respond(200, content, etag)
+
+    def _respond(self, status: int, content: bytes = b"", etag: str = None):
+        self.__class__.requests_by_status[status] = self.__class__.requests_by_status.get(status, 0) + 1
+
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def icon_host():
+    _IconHandler.requests_by_status = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _IconHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_mirror_stores_identical_icons_once(icon_host, tmp_path):
+    mirror = IconMirror(str(tmp_path), max_workers=2)
+    paths = mirror.mirror([
+        f"{icon_host}/images/fireball.png",
+        f"{icon_host}/images/fireball.png",
+        f"{icon_host}/images/fireball_copy.png",
+        f"{icon_host}/images/firestorm.png"
+    ])
+
+    assert _IconHandler.requests_by_status == {200: 3}
+    assert paths[f"{icon_host}/images/fireball.png"] == paths[f"{icon_host}/images/fireball_copy.png"]
+    assert paths[f"{icon_host}/images/fireball.png"] != paths[f"{icon_host}/images/firestorm.png"]
+    with open(paths[f"{icon_host}/images/firestorm.png"], "rb") as icon_file:
+        assert icon_file.read() == b"firestorm icon"
+
+
+def test_mirror_maps_missing_icons_to_none(icon_host, tmp_path):
+    mirror = IconMirror(str(tmp_path), max_attempts=1)
+    paths = mirror.mirror([f"{icon_host}/images/missing.png"])
+
+    assert paths == {f"{icon_host}/images/missing.png": None}
+
+
+def test_mirror_revalidates_on_rerun(icon_host, tmp_path):
+    url = f"{icon_host}/images/fireball.png"
+    first_path = IconMirror(str(tmp_path)).mirror([url])[url]
+
+    # A new mirror over the same store reads the manifest and sends If-None-Match
+    second_path = IconMirror(str(tmp_path)).mirror([url])[url]
+
+    assert second_path == first_path
+    assert _IconHandler.requests_by_status == {200: 1, 304: 1}
+
+
+def test_mirror_column_adds_local_paths(icon_host, tmp_path):
+    df = pd.DataFrame({
+        "id": ["fireball", "missing", "none"],
+        "image_file_name": [f"{icon_host}/images/fireball.png", f"{icon_host}/images/missing.png", None]
+    })
+    df = IconMirror(str(tmp_path), max_attempts=1).mirror_column(df, url_col_name="image_file_name")
+
+    assert list(df.columns) == ["id", "image_file_name", "image_local_path"]
+    assert df["image_local_path"][0].startswith(str(tmp_path))
+    assert df["image_local_path"][1] is None
+    assert df["image_local_path"][2] is None